@@ -0,0 +1,59 @@
+import sys
+import time
+
+from pycparser.c_parser import CParser
+
+from parsing.parser_pool import ParserPool
+
+
+SOURCE = '''
+int f(int *t, int n) {
+    int i, s = 0;
+    for (i = 0; i < n; i++) {
+        if (t[i] > 0) {
+            s = s + t[i];
+        }
+    }
+    return s;
+}
+'''
+
+
+def _time_per_file(parse, files_count):
+    start = time.perf_counter()
+    for _ in range(files_count):
+        parse(SOURCE)
+
+    return (time.perf_counter() - start) / files_count
+
+
+def run(files_count=500, tables_dir=None):
+    pool = ParserPool(tables_dir)
+
+    # Built once per worker, so kept out of the per-file figures
+    start = time.perf_counter()
+    pool.get_parser()
+    pool_startup = time.perf_counter() - start
+
+    new_parser = _time_per_file(lambda text: CParser().parse(text), files_count)
+    pooled_parser = _time_per_file(lambda text: pool.get_parser().parse(text), files_count)
+
+    return {
+        'files': files_count,
+        'pool_startup_ms': pool_startup * 1000,
+        'new_parser_ms': new_parser * 1000,
+        'pooled_parser_ms': pooled_parser * 1000,
+        'overhead_ms': (new_parser - pooled_parser) * 1000,
+    }
+
+
+if __name__ == '__main__':
+    files_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    tables_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    result = run(files_count, tables_dir)
+
+    print(f'{result["files"]} files')
+    print(f'Pool startup:         {result["pool_startup_ms"]:.3f} ms')
+    print(f'New CParser per file: {result["new_parser_ms"]:.3f} ms/file')
+    print(f'Pooled CParser:       {result["pooled_parser_ms"]:.3f} ms/file')
+    print(f'Per-file overhead:    {result["overhead_ms"]:.3f} ms/file')
@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.corpus_generator import CorpusGenerator
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['numpy', 'scipy', 'sklearn', 'matplotlib']
+
+# Command line of each command and the heavy modules it must not load
+COMMANDS = {
+    'help': (['--help'], {'numpy', 'scipy', 'sklearn', 'matplotlib'}),
+    'export': (['export', '--output', '{store}'], {'scipy', 'sklearn', 'matplotlib'}),
+    'compare': (['--no-plot', 'compare', '-f', '{names}'], {'matplotlib'}),
+    'threshold': (['--no-plot', 'threshold', '-f', '{names}'], {'matplotlib'}),
+    'monitor': (['--no-plot', 'monitor', '-f', '{names}'], {'matplotlib'}),
+}
+
+
+def _parse_importtime(stderr):
+    # Lines are "import time: self [us] | cumulative | imported package", the
+    # package name is indented by its import depth
+    total, loaded = 0, set()
+
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        loaded.add(name.strip().split('.')[0])
+
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+
+    return total / 1e6, loaded
+
+
+def _run_command(args, cwd):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(ROOT, 'main.py'), *args],
+        cwd=cwd, env={**os.environ, 'PYTHONPATH': ROOT}, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+
+    if process.returncode != 0:
+        raise RuntimeError(f'{args} failed:\n{process.stderr[-2000:]}')
+
+    import_time, loaded = _parse_importtime(process.stderr)
+    return wall, import_time, loaded
+
+
+def run(commands=None, repeat=3, files_count=2, functions_count=5):
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        corpus = os.path.join(tmp_path, 'corpus')
+        CorpusGenerator(0, 1, 2).write(corpus, files_count, functions_count)
+        names = ','.join(f'file{file_idx}_f{idx}' for file_idx in range(files_count)
+            for idx in range(functions_count))
+
+        # DisplayManager writes its results relatively to the working directory
+        os.makedirs(os.path.join(tmp_path, 'clustering_', 'results'))
+
+        for command in commands or COMMANDS:
+            args, forbidden = COMMANDS[command]
+            args = ['--path', corpus, *(arg.format(store=os.path.join(tmp_path, 'store'), names=names)
+                for arg in args)]
+
+            # The fastest run is kept, the others mostly measure the disk cache
+            runs = [_run_command(args, tmp_path) for _ in range(repeat)]
+            wall, import_time, loaded = min(runs, key=lambda run_: run_[0])
+
+            results[command] = {
+                'wall_s': wall,
+                'import_s': import_time,
+                'heavy_modules': sorted(loaded.intersection(HEAVY_MODULES)),
+                'forbidden_modules': sorted(loaded.intersection(forbidden)),
+            }
+
+    return results
+
+
+def check(results, max_seconds=None):
+    failures = []
+
+    for command, result in results.items():
+        if result['forbidden_modules']:
+            failures.append(f'{command}: loads {", ".join(result["forbidden_modules"])}')
+        if max_seconds is not None and result['wall_s'] > max_seconds:
+            failures.append(f'{command}: {result["wall_s"]:.2f}s > {max_seconds:.2f}s')
+
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the startup of each cscv command')
+    parser.add_argument('commands', nargs='*', help=f'among {", ".join(COMMANDS)}, all by default')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-seconds', type=float, help='fail when a command takes longer')
+    parser.add_argument('--output', help='JSON file the results are written to')
+    args = parser.parse_args(argv)
+
+    unknown = set(args.commands).difference(COMMANDS)
+    if unknown:
+        parser.error(f'unknown commands: {", ".join(sorted(unknown))}')
+
+    results = run(args.commands or None, args.repeat)
+
+    for command, result in results.items():
+        print(f'{command:<10} {result["wall_s"]:7.3f}s total  {result["import_s"]:7.3f}s imports  '
+            f'{", ".join(result["heavy_modules"]) or "-"}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    failures = check(results, args.max_seconds)
+    for failure in failures:
+        print(f'FAIL {failure}')
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import os
+import random
+
+
+HEADER = '''struct node { int value; struct node *next; };
+int helper(int a, int b);
+'''
+
+BINARY_OPS = ['+', '-', '*', '/', '%']
+COMPARISON_OPS = ['<', '<=', '>', '>=', '==', '!=']
+LOGICAL_OPS = ['&&', '||']
+
+
+class CorpusGenerator:
+    """Random but valid C sources, made only of the constructs ASTVisitor counts."""
+
+    def __init__(self, seed=0, depth=3, statements=6):
+        self.random = random.Random(seed)
+        self.depth = depth
+        self.statements = statements
+
+    def expression(self, level=0):
+        choice = self.random.randrange(6 if level < 2 else 3)
+
+        if choice == 0:
+            return self.random.choice(['i', 'n', 'k', 't[i]', 'p->value', 'q.value'])
+        if choice == 1:
+            return str(self.random.randrange(100))
+        if choice == 2:
+            return f'(int) {self.random.choice(["k", "n"])}'
+        if choice == 3:
+            return f'helper({self.expression(level + 1)}, {self.expression(level + 1)})'
+        if choice == 4:
+            return f'!({self.expression(level + 1)})'
+
+        op = self.random.choice(BINARY_OPS)
+        return f'({self.expression(level + 1)} {op} {self.expression(level + 1)})'
+
+    def condition(self):
+        op = self.random.choice(COMPARISON_OPS)
+        condition = f'{self.expression(1)} {op} {self.expression(1)}'
+
+        if self.random.random() < 0.3:
+            condition = f'({condition}) {self.random.choice(LOGICAL_OPS)} k != 0'
+
+        return condition
+
+    def statement(self, depth):
+        choice = self.random.randrange(6 if depth < self.depth else 2)
+
+        if choice == 0:
+            return f'k = {self.expression()};'
+        if choice == 1:
+            return f'{self.random.choice(["i++;", "k--;", "++n;", "t[i] = k;"])}'
+        if choice == 2:
+            return f'if ({self.condition()}) {self.block(depth + 1)} else {self.block(depth + 1)}'
+        if choice == 3:
+            return f'for (i = 0; i < n; i++) {self.block(depth + 1)}'
+        if choice == 4:
+            return f'while ({self.condition()}) {self.block(depth + 1)}'
+
+        return f'do {self.block(depth + 1)} while ({self.condition()});'
+
+    def block(self, depth):
+        count = self.random.randint(1, self.statements)
+        return '{ ' + ' '.join(self.statement(depth) for _ in range(count)) + ' }'
+
+    def function(self, name):
+        body = ' '.join(self.statement(1) for _ in range(self.statements))
+
+        return (f'int {name}(int *t, int n, struct node *p) {{\n'
+            f'    int i; int k; struct node q;\n    {body}\n    return k;\n}}\n')
+
+    def file(self, prefix, functions_count):
+        functions = [self.function(f'{prefix}_f{idx}') for idx in range(functions_count)]
+        return '#include <stdio.h>\n' + HEADER + '\n'.join(functions)
+
+    def write(self, path, files_count, functions_count, directories=1):
+        filenames = []
+
+        for idx in range(files_count):
+            directory = os.path.join(path, f'dir{idx % directories}') if directories > 1 else path
+            os.makedirs(directory, exist_ok=True)
+
+            filename = os.path.join(directory, f'file{idx}.c')
+            with open(filename, 'w') as file:
+                file.write(self.file(f'file{idx}', functions_count))
+
+            filenames.append(filename)
+
+        return filenames
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.corpus_generator import CorpusGenerator
+
+from clustering_.algorithms import AlgorithmManager, _load_sklearn
+
+from parsing.file_manager import FileManager
+from parsing.parser_pool import ParserPool
+from parsing.ast_visitor import ASTVisitor, FunctionOutput
+from parsing.accumulating_visitor import AccumulatingVisitor
+from parsing.vector import Vector
+
+
+def _timed(func, *args, **kwargs):
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    result = func(*args, **kwargs)
+    timing = {'wall': time.perf_counter() - start_wall, 'cpu': time.process_time() - start_cpu}
+
+    return result, timing
+
+
+def _get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_parsing(path):
+    stages = {}
+    file_manager = FileManager()
+
+    (contents, names), stages['file_io'] = _timed(file_manager.load_directory, path)
+
+    parser = ParserPool().get_parser()
+    asts, stages['parse'] = _timed(lambda: [parser.parse(text) for text in contents])
+
+    visitor = ASTVisitor()
+    outputs, stages['visit'] = _timed(lambda: [visitor.visit(ast) for ast in asts])
+
+    accumulating_visitor = AccumulatingVisitor()
+    _, stages['visit_accumulating'] = _timed(lambda: [accumulating_visitor.visit(ast) for ast in asts])
+
+    functions = [output for file_outputs in outputs for output in file_outputs]
+    stages['file_io']['files'] = len(names)
+    stages['visit']['functions'] = len(functions)
+
+    return functions, stages
+
+
+def bench_clustering(functions, agglo_kwargs, kmeans_kwargs):
+    stages = {}
+    vectors, labels = FunctionOutput.split_context_list(functions)
+    matrix = Vector.vector_list_to_matrix(vectors)
+
+    # Timed on its own, so that the first algorithm is not charged for it
+    _, stages['sklearn_import'] = _timed(_load_sklearn)
+
+    # A fresh manager (and distance cache) per algorithm, each timing stands alone
+    for linkage in AlgorithmManager.AGGLOMERATIVE_ALGORITHMS:
+        algorithm_manager = AlgorithmManager()
+        _, stages[f'agglomerative_{linkage}'] = _timed(
+            algorithm_manager.agglo_clustering, matrix, **agglo_kwargs, linkage=linkage)
+
+    algorithm_manager = AlgorithmManager()
+    _, stages['kmeans'] = _timed(algorithm_manager.kmeans_clustering, matrix, **kmeans_kwargs)
+    _, stages['minibatch_kmeans'] = _timed(
+        algorithm_manager.minibatch_kmeans_clustering, matrix, **kmeans_kwargs)
+    _, stages['birch'] = _timed(
+        algorithm_manager.birch_clustering, matrix, n_clusters=kmeans_kwargs['n_clusters'])
+
+    return stages
+
+
+def run(files_count=50, functions_count=10, depth=3, seed=0, directories=1, path=None, clustering=True):
+    with tempfile.TemporaryDirectory() as tmp_path:
+        path = path or tmp_path
+        CorpusGenerator(seed, depth).write(path, files_count, functions_count, directories)
+
+        functions, stages = bench_parsing(path)
+
+    if clustering:
+        stages.update(bench_clustering(functions,
+            {'n_clusters': None, 'distance_threshold': 5},
+            {'n_clusters': 8, 'random_state': 0}))
+
+    return {
+        'commit': _get_commit(),
+        'python': platform.python_version(),
+        'corpus': {'files': files_count, 'functions_per_file': functions_count,
+            'depth': depth, 'seed': seed, 'directories': directories},
+        'stages': stages
+    }
+
+
+def compare(baseline, result):
+    lines = [f'{"stage":<28}{"baseline":>12}{"current":>12}{"ratio":>8}']
+
+    for stage, timing in result['stages'].items():
+        if stage not in baseline['stages']:
+            continue
+
+        before, after = baseline['stages'][stage]['wall'], timing['wall']
+        ratio = after / before if before else float('inf')
+        lines.append(f'{stage:<28}{before:>11.3f}s{after:>11.3f}s{ratio:>8.2f}')
+
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time each stage of the pipeline on a synthetic corpus')
+    parser.add_argument('--files', type=int, default=50)
+    parser.add_argument('--functions', type=int, default=10, help='functions per file')
+    parser.add_argument('--depth', type=int, default=3, help='maximum statement nesting')
+    parser.add_argument('--directories', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-clustering', action='store_true')
+    parser.add_argument('--output', help='JSON file the results are written to')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    args = parser.parse_args(argv)
+
+    result = run(args.files, args.functions, args.depth, args.seed, args.directories,
+        clustering=not args.no_clustering)
+
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            print(compare(json.load(file), result))
+    else:
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,44 @@
 import numpy as np
 import statistics
 import math
+import time
+import warnings
 
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.cluster import KMeans
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+from scipy import sparse
+from scipy.cluster import hierarchy
+
+from clustering_.deduplication import Deduplication
 from clustering_.display_manager import SummaryElement
+from clustering_.distance_cache import DistanceCache
+from clustering_.incremental import IncrementalSingleLinkage
+from clustering_.linkage_tree import LinkageTree
 
 
 class UnexecutedAlgorithm(Exception):
     pass
 
 
+def _load_sklearn():
+    # The algorithms import scikit-learn themselves, loading it first keeps
+    # its import out of the timing of whichever algorithm runs first
+    import sklearn.cluster
+    import sklearn.metrics
+
+
+def _run_algorithm(func, vectors, kwargs, cpu_clock=time.process_time, sample_weight=None):
+    if sample_weight is not None:
+        kwargs = {**kwargs, 'sample_weight': sample_weight}
+
+    _load_sklearn()
+
+    start_wall, start_cpu = time.perf_counter(), cpu_clock()
+    result = func(vectors, **kwargs)
+
+    return result, time.perf_counter() - start_wall, cpu_clock() - start_cpu
+
+
 class AlgorithmElement:
     def __init__(self, func, labels, vectors, kwargs=None, title=None):
         self.func = func
@@ -21,92 +48,382 @@ class AlgorithmElement:
         self.title = title or ''
 
         self.clusters_ = None
+        self.wall_time_ = None
+        self.cpu_time_ = None
+
+        self.deduplication = None
+        self.sample_weight = None
+
+    def set_deduplication(self, deduplication, weighted=False):
+        # Run on the unique rows, clusters_ is expanded back afterwards
+        self.deduplication = deduplication
+        self.vectors = deduplication.unique
+        self.sample_weight = deduplication.counts if weighted else None
     
     def to_summary_element(self):
         if self.clusters_ is None:
             raise UnexecutedAlgorithm()
             
         data = (self.labels, self.clusters_)
-        return SummaryElement(data, self.title, str(self.kwargs))
+        return SummaryElement(data, self.title, str(self.kwargs), self.wall_time_, self.cpu_time_)
 
 
 class AlgorithmManager:
     AGGLOMERATIVE_ALGORITHMS = ['ward', 'complete', 'average', 'single']
+    CHUNK_SIZE = 4096
+    DEDUPLICATED_LINKAGES = ['single']
+    # Linkages built from the shared distances, ward needs the vectors themselves
+    CACHED_LINKAGES = ['complete', 'average', 'single']
+    CACHED_KWARGS = {'linkage', 'n_clusters', 'distance_threshold', 'metric', 'affinity',
+        'compute_full_tree', 'compute_distances'}
+
+    def __init__(self, jobs=None, executor=None, use_threads=False, distance_cache=None,
+            deduplicate=False, metrics=None):
+        self.jobs = jobs
+        self.executor = executor
+        self.use_threads = use_threads
+        self.distance_cache = distance_cache or DistanceCache()
+        self.deduplicate = deduplicate
+        self.metrics = metrics
+
+    def __getstate__(self):
+        # Bound methods sent to worker processes carry the manager, never its pool
+        state = self.__dict__.copy()
+        state['executor'] = None
+        return state
 
     def to_numpy_array(self, data):
+        # Sparse matrices are kept sparse (as CSR) for the algorithms that
+        # accept them: KMeans, MiniBatchKMeans, Birch and the linkages built
+        # from the cached distances
+        if sparse.issparse(data):
+            return data.tocsr()
+
         return np.asarray(data)
 
     def agglo_clustering(self, data, **kwargs):
         data = self.to_numpy_array(data)
+
+        if self._uses_distance_cache(kwargs):
+            distances = self.distance_cache.get(data, self._get_metric(kwargs))
+            return self._cluster_from_distances(distances, data.shape[0], kwargs)
+
+        # scikit-learn is only imported by the algorithms that use it
+        from sklearn.cluster import AgglomerativeClustering
+
         clustering = AgglomerativeClustering(**kwargs).fit(X=data)
         return clustering.labels_
 
-    def kmeans_clustering(self, data, **kwargs):
+    def kmeans_clustering(self, data, sample_weight=None, **kwargs):
+        from sklearn.cluster import KMeans
+
         data = self.to_numpy_array(data)
-        kmeans = KMeans(**kwargs).fit(data)
+        kmeans = KMeans(**kwargs).fit(data, sample_weight=sample_weight)
         return kmeans.labels_
     
+    def minibatch_kmeans_clustering(self, data, chunk_size=None, sample_weight=None, **kwargs):
+        from sklearn.cluster import MiniBatchKMeans
+
+        model = MiniBatchKMeans(**kwargs)
+        chunks = []
+        start = 0
+
+        for chunk in self.iter_chunks(data, chunk_size, model.n_clusters):
+            end = start + chunk.shape[0]
+            chunk_weight = sample_weight[start:end] if sample_weight is not None else None
+            model.partial_fit(chunk, sample_weight=chunk_weight)
+            chunks.append(chunk)
+            start = end
+
+        return self._predict_chunks(model, chunks)
+
+    def birch_clustering(self, data, chunk_size=None, **kwargs):
+        from sklearn.cluster import Birch
+
+        model = Birch(**kwargs)
+        n_clusters = model.n_clusters
+
+        # The global clustering of the subclusters only runs once, after the
+        # last chunk, instead of on every partial_fit
+        model.set_params(n_clusters=None)
+        chunks = []
+
+        for chunk in self.iter_chunks(data, chunk_size):
+            model.partial_fit(chunk)
+            chunks.append(chunk)
+
+        model.set_params(n_clusters=n_clusters)
+        model.partial_fit()
+
+        return self._predict_chunks(model, chunks)
+
+    def iter_chunks(self, data, chunk_size=None, min_size=1):
+        chunk_size = max(chunk_size or AlgorithmManager.CHUNK_SIZE, min_size)
+
+        # Arrays and sparse matrices are sliced by rows, any other iterable is
+        # treated as a stream of chunks (lists of vectors, arrays or sparse
+        # matrices) and regrouped
+        if isinstance(data, np.ndarray) or sparse.issparse(data):
+            data = self.to_numpy_array(data)
+            for start in range(0, data.shape[0], chunk_size):
+                yield data[start:start + chunk_size]
+            return
+
+        pending, pending_size = [], 0
+        for chunk in data:
+            chunk = self.to_numpy_array(chunk)
+            pending.append(chunk)
+            pending_size += chunk.shape[0]
+
+            if pending_size >= chunk_size:
+                yield self._concatenate(pending)
+                pending, pending_size = [], 0
+
+        if pending:
+            yield self._concatenate(pending)
+
+    def _concatenate(self, chunks):
+        if any(sparse.issparse(chunk) for chunk in chunks):
+            return sparse.vstack(chunks, format='csr')
+
+        return np.concatenate(chunks)
+
+    def _predict_chunks(self, model, chunks):
+        labels = [model.predict(chunk) for chunk in chunks]
+        return np.concatenate(labels) if labels else np.empty(0, dtype=int)
+
     def start_algorithm(self, algorithm_element):
-        result = algorithm_element.func(algorithm_element.vectors, **algorithm_element.kwargs)
-        algorithm_element.clusters_ = result
+        result = _run_algorithm(algorithm_element.func, algorithm_element.vectors,
+            algorithm_element.kwargs, sample_weight=algorithm_element.sample_weight)
+        self._set_result(algorithm_element, result)
 
         return algorithm_element.to_summary_element()
+
+    def start_algorithms(self, algorithm_elements):
+        return list(self.iter_algorithms(algorithm_elements))
+
+    def iter_algorithms(self, algorithm_elements):
+        # Summary elements are yielded in order, each one as soon as its
+        # algorithm is done, so that a report can be written meanwhile
+        if self.executor is not None:
+            yield from self._start_algorithms_with(self.executor, algorithm_elements)
+            return
+
+        if self.jobs is not None and self.jobs > 1 and len(algorithm_elements) > 1:
+            executor_class = ThreadPoolExecutor if self.use_threads else ProcessPoolExecutor
+            with executor_class(max_workers=self.jobs) as executor:
+                yield from self._start_algorithms_with(executor, algorithm_elements)
+            return
+
+        for algo in algorithm_elements:
+            yield self.start_algorithm(algo)
+
+    def _start_algorithms_with(self, executor, algorithm_elements):
+        # The process clock would add up every thread of the pool
+        cpu_clock = time.thread_time if isinstance(executor, ThreadPoolExecutor) else time.process_time
+        futures = [executor.submit(
+            _run_algorithm, algo.func, algo.vectors, algo.kwargs, cpu_clock, algo.sample_weight)
+            for algo in algorithm_elements]
+
+        for algo, future in zip(algorithm_elements, futures):
+            self._set_result(algo, future.result())
+            yield algo.to_summary_element()
+
+    def _set_result(self, algorithm_element, result):
+        algorithm_element.clusters_, algorithm_element.wall_time_, algorithm_element.cpu_time_ = result
+
+        if self.metrics is not None:
+            self.metrics.add_algorithm(algorithm_element.title, algorithm_element.wall_time_)
+
+        if algorithm_element.deduplication is not None:
+            algorithm_element.clusters_ = algorithm_element.deduplication.expand(algorithm_element.clusters_)
+
+    def deduplicate_elements(self, algorithm_elements, vectors):
+        if not self.deduplicate or sparse.issparse(vectors):
+            return algorithm_elements
+
+        deduplication = Deduplication(vectors)
+
+        for algo in algorithm_elements:
+            if self._supports_deduplication(algo, deduplication):
+                weighted = algo.func in (self.kmeans_clustering, self.minibatch_kmeans_clustering)
+                algo.set_deduplication(deduplication, weighted)
+
+        return algorithm_elements
+
+    def _supports_deduplication(self, algorithm_element, deduplication):
+        kwargs = algorithm_element.kwargs
+
+        # No more clusters can be asked than there are unique rows
+        if (kwargs.get('n_clusters') or 0) > len(deduplication):
+            return False
+
+        # Weighted KMeans on the unique rows minimises the same inertia
+        if algorithm_element.func in (self.kmeans_clustering, self.minibatch_kmeans_clustering):
+            return True
+
+        # Duplicates are at distance 0: merged first and without changing any
+        # single linkage distance. Complete linkage breaks ties between equal
+        # distances differently once they are gone, and ward and average
+        # depend on the cluster sizes
+        return algorithm_element.func == self.agglo_clustering \
+            and kwargs.get('linkage') in AlgorithmManager.DEDUPLICATED_LINKAGES \
+            and (kwargs.get('distance_threshold') is None or kwargs['distance_threshold'] > 0)
     
     def compare_algorithms(self, labels, vectors, agglo_kwargs=None, kmeans_kwargs=None):
+        return list(self.iter_compare_algorithms(labels, vectors, agglo_kwargs, kmeans_kwargs))
+
+    def iter_compare_algorithms(self, labels, vectors, agglo_kwargs=None, kmeans_kwargs=None):
+        # Summary elements are yielded as each algorithm finishes, KMeans last
         if agglo_kwargs is None:
             agglo_kwargs = {}
         
         if kmeans_kwargs is None:
             kmeans_kwargs = {'random_state': 0}
 
-        agglo_algorithm_elements = self._generate_agglomerative_algorithm_elements(
-            labels, vectors, agglo_kwargs)
+        agglo_algorithm_elements = self.deduplicate_elements(
+            self._generate_agglomerative_algorithm_elements(labels, vectors, agglo_kwargs), vectors)
+
+        # Computed once here, the workers of the batch memory-map the same
+        # matrix rather than computing it again (see DistanceCache.__getstate__)
+        if self._uses_distance_cache({**agglo_kwargs, 'linkage': 'complete'}):
+            self.distance_cache.get(self.to_numpy_array(vectors))
+
+        # KMeans needs the average agglomerative cluster count: it runs after the batch
+        agglomerative_results = []
+        for result in self.iter_algorithms(agglo_algorithm_elements):
+            agglomerative_results.append(result)
+            yield result
 
-        agglomerative_results = [self.start_algorithm(algo) for algo in agglo_algorithm_elements] 
         average_length = self._get_average_clusters_number(agglomerative_results)
 
         if 'n_clusters' not in kmeans_kwargs:
             kmeans_kwargs['n_clusters'] = average_length
 
         kmeans_algorithm_element = self._generate_kmeans_algorithm_elements(labels, vectors, kmeans_kwargs)
-        results = [*agglomerative_results, self.start_algorithm(kmeans_algorithm_element)]
+        self.deduplicate_elements([kmeans_algorithm_element], vectors)
 
-        return results
+        yield self.start_algorithm(kmeans_algorithm_element)
     
-    def compare_distance_threshold(self, labels, vectors):
-        kwargs = {'n_clusters': None}
+    def compare_streaming_algorithms(self, labels, vectors, minibatch_kwargs=None, birch_kwargs=None):
+        # vectors is an array or a re-iterable source of chunks, a generator
+        # can only feed a single algorithm
+        algorithm_elements = self._generate_streaming_algorithm_elements(
+            labels, vectors, minibatch_kwargs or {'random_state': 0}, birch_kwargs or {})
+
+        # Only arrays can be deduplicated, streams are consumed as they come
+        if isinstance(vectors, np.ndarray) or sparse.issparse(vectors):
+            self.deduplicate_elements(algorithm_elements, vectors)
+
+        return self.start_algorithms(algorithm_elements)
+
+    def build_linkage_tree(self, data, linkage='ward', **kwargs):
+        data = self.to_numpy_array(data)
+
+        if self._uses_distance_cache({'linkage': linkage, **kwargs}):
+            distances = self.distance_cache.get(data, self._get_metric(kwargs))
+            return self._build_linkage_tree_from_distances(distances, data.shape[0], linkage)
+
+        from sklearn.cluster import AgglomerativeClustering
+
+        clustering = AgglomerativeClustering(
+            n_clusters=None,
+            distance_threshold=0,
+            compute_full_tree=True,
+            linkage=linkage,
+            **kwargs
+        ).fit(X=data)
+
+        return LinkageTree(clustering.children_, clustering.distances_, len(data), linkage)
+
+    def _build_linkage_tree_from_distances(self, distances, n_samples, linkage):
+        # What AgglomerativeClustering does for unstructured non-ward linkages,
+        # minus the distance computation
+        tree = hierarchy.linkage(np.asarray(distances, dtype=np.float64), method=linkage)
+        return LinkageTree(tree[:, :2].astype(int), tree[:, 2], n_samples, linkage)
+
+    def _cluster_from_distances(self, distances, n_samples, kwargs):
+        tree = self._build_linkage_tree_from_distances(distances, n_samples, kwargs['linkage'])
+
+        if kwargs.get('distance_threshold') is not None:
+            return tree.cut(kwargs['distance_threshold'])
+
+        return tree.cut_n_clusters(kwargs.get('n_clusters') or 2)
+
+    def _get_metric(self, kwargs):
+        return kwargs.get('metric') or kwargs.get('affinity') or 'euclidean'
+
+    def _uses_distance_cache(self, kwargs):
+        return self.distance_cache is not None \
+            and kwargs.get('linkage') in AlgorithmManager.CACHED_LINKAGES \
+            and self._get_metric(kwargs) == 'euclidean' \
+            and set(kwargs) <= AlgorithmManager.CACHED_KWARGS
+
+    def compare_distance_threshold(self, labels, vectors, thresholds=None):
+        if thresholds is None:
+            thresholds = list(range(1, 16))
+
         results = []
-        
-        for algorithm in AlgorithmManager.AGGLOMERATIVE_ALGORITHMS:
-            algorithms = []
-            kwargs['linkage'] = algorithm
-            for threshold in range(1, 16):
-                title = f'Agglomerative algorithm with Complete linkage with {threshold} as distance threshold'
-                kwargs['distance_threshold'] = threshold
-                algorithm_element = AlgorithmElement(
-                    self.agglo_clustering,
-                    labels,
-                    vectors,
-                    kwargs.copy(),
-                    title
-                )
-
-                algorithms.append(algorithm_element)
-            
-            algorithms_results = [self.start_algorithm(algo) for algo in algorithms]
-            clusters_lengths = [len(set(algo.get_clusters())) for algo in algorithms_results]
-            results.append({'linkage': algorithm, 'result': clusters_lengths})
+
+        # The tree is identical for every threshold: fitted once per linkage
+        # then cut at each threshold
+        deduplication = Deduplication(vectors) \
+            if self.deduplicate and min(thresholds) > 0 and not sparse.issparse(vectors) else None
+
+        for algorithm in self._get_linkages(vectors):
+            if deduplication is not None and algorithm in AlgorithmManager.DEDUPLICATED_LINKAGES:
+                tree = self.build_linkage_tree(deduplication.unique, algorithm)
+                clusters_lengths, clusters = tree.sweep(thresholds)
+                clusters = [deduplication.expand(labels) for labels in clusters]
+            else:
+                tree = self.build_linkage_tree(vectors, algorithm)
+                clusters_lengths, clusters = tree.sweep(thresholds)
+
+            results.append({
+                'linkage': algorithm,
+                'thresholds': thresholds,
+                'result': clusters_lengths,
+                'labels': clusters
+            })
 
         return results
     
     def monitor_cluster_evolution(self, labels, vectors, used_kwargs):
-        length = len(vectors)
+        # Single linkage cut at a distance threshold is followed incrementally,
+        # one union-find insertion per vector. Any other setting refits the
+        # clustering on every prefix (from the shared distances when it can),
+        # which grows much faster than the number of vectors
+        vectors = self.to_numpy_array(vectors)
+        length = vectors.shape[0]
         results = []
         clusters = []
 
+        incremental = self._supports_incremental(used_kwargs) and not sparse.issparse(vectors)
+
+        if not incremental and length > 1:
+            warnings.warn(f'monitor_cluster_evolution refits {used_kwargs} on each of the {length} '
+                'prefixes, only single linkage with a distance_threshold is incremental',
+                RuntimeWarning, stacklevel=2)
+
+        cached = not incremental and self._uses_distance_cache(used_kwargs)
+
+        # Empty input: no prefix to cluster, the loop below does not run
+        if incremental and length:
+            engine = IncrementalSingleLinkage(used_kwargs['distance_threshold'])
+            engine.add(vectors[0])
+        elif cached:
+            # Every prefix reuses the distances of the whole set
+            distances = self.distance_cache.get(self.to_numpy_array(vectors))
+
         for idx in range(1, length):
-            data = vectors[:idx + 1]
-            result = self.agglo_clustering(data, **used_kwargs)
+            if incremental:
+                result = engine.add(vectors[idx]).get_labels()
+            elif cached:
+                prefix_distances = DistanceCache.get_prefix(distances, length, idx + 1)
+                result = self._cluster_from_distances(prefix_distances, idx + 1, used_kwargs)
+            else:
+                data = vectors[:idx + 1]
+                result = self.agglo_clustering(data, **used_kwargs)
 
             clusters.append(len(set(result)))
             results.append(f'Ajout de D{idx} :\n{result}')
@@ -116,15 +433,30 @@ class AlgorithmManager:
 
         return final_text, clusters
 
+    def _supports_incremental(self, kwargs):
+        # Only single linkage has an exact incremental form, the other
+        # linkages are refitted on every prefix
+        return kwargs.get('linkage') == 'single' \
+            and kwargs.get('n_clusters') is None \
+            and kwargs.get('distance_threshold') is not None \
+            and kwargs.get('metric', kwargs.get('affinity', 'euclidean')) == 'euclidean'
     
     def _get_average_clusters_number(self, algorithm_elements):
         lengths = [len(set(algo.get_clusters())) for algo in algorithm_elements]
         return math.floor(statistics.mean(lengths))
 
+    def _get_linkages(self, vectors):
+        # Ward needs the dense vectors, the other linkages work on the
+        # distances of the sparse rows
+        if sparse.issparse(vectors):
+            return AlgorithmManager.CACHED_LINKAGES
+
+        return AlgorithmManager.AGGLOMERATIVE_ALGORITHMS
+
     def _generate_agglomerative_algorithm_elements(self, labels, vectors, agglo_kwargs):
         algorithm_elements = []
 
-        for algorithm in AlgorithmManager.AGGLOMERATIVE_ALGORITHMS:
+        for algorithm in self._get_linkages(vectors):
             agglo_kwargs['linkage'] = algorithm
             title = f'Agglomerative algorithm with {algorithm.capitalize()} linkage'
             algorithm_element = AlgorithmElement(
@@ -146,4 +478,22 @@ class AlgorithmManager:
             vectors,
             kmeans_kwargs.copy(),
             'Kmeans algorithm'
-        )
\ No newline at end of file
+        )
+
+    def _generate_streaming_algorithm_elements(self, labels, vectors, minibatch_kwargs, birch_kwargs):
+        return [
+            AlgorithmElement(
+                self.minibatch_kmeans_clustering,
+                labels,
+                vectors,
+                minibatch_kwargs.copy(),
+                'Mini-batch Kmeans algorithm'
+            ),
+            AlgorithmElement(
+                self.birch_clustering,
+                labels,
+                vectors,
+                birch_kwargs.copy(),
+                'Birch algorithm'
+            )
+        ]
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class Deduplication:
+    """Identical vectors collapsed into unique rows and their multiplicities.
+
+    unique[inverse] rebuilds the original vectors, so labels computed on the
+    unique rows are expanded back to every original function the same way.
+    """
+
+    def __init__(self, vectors):
+        unique, first_seen, inverse, counts = np.unique(np.asarray(vectors), axis=0,
+            return_index=True, return_inverse=True, return_counts=True)
+
+        # Unique rows kept in order of first appearance rather than sorted, so
+        # that ties are met in the same order as in the original vectors
+        order = np.argsort(first_seen)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        self.unique = unique[order]
+        self.inverse = rank[inverse.reshape(-1)]
+        self.counts = counts[order]
+
+    def __len__(self):
+        return len(self.unique)
+
+    def get_ratio(self):
+        return len(self.unique) / len(self.inverse) if len(self.inverse) else 1
+
+    def expand(self, labels):
+        return np.asarray(labels)[self.inverse]
@@ -1,12 +1,16 @@
 import os
+import csv
+import json
 import datetime
 
 
 class SummaryElement:
-    def __init__(self, data, title=None, used_kwargs=None):
+    def __init__(self, data, title=None, used_kwargs=None, wall_time=None, cpu_time=None):
         self.data = data # tuple(str, str) -> tuple(labels, clusters_id)
         self.title = title = title or ''
         self.used_kwargs = used_kwargs or ''
+        self.wall_time = wall_time # seconds
+        self.cpu_time = cpu_time # seconds
     
     def get_labels(self):
         return self.data[0]
@@ -31,12 +35,39 @@ class SummaryBuilder:
 
         return self
     
+    def with_timings(self, wall_time, cpu_time):
+        if wall_time is not None:
+            self.strings.append(f'wall time: {wall_time:.3f}s, cpu time: {cpu_time:.3f}s')
+
+        return self
+
     def with_data(self, labels, clusters_id):
-        strings = []
+        self.strings.append(self._join('\n', self.iter_data_lines(labels, clusters_id))) 
+
+        return self
+    
+    def from_summary_element(self, element):
+        self.with_title(element.title) \
+            .with_kwargs(element.used_kwargs) \
+            .with_timings(element.wall_time, element.cpu_time) \
+            .with_data(*element.data) 
+
+        return self
+
+    def iter_element_lines(self, element):
+        # Same lines as from_summary_element, one at a time
+        yield element.title
+        yield str(element.used_kwargs)
+
+        if element.wall_time is not None:
+            yield f'wall time: {element.wall_time:.3f}s, cpu time: {element.cpu_time:.3f}s'
+
+        yield from self.iter_data_lines(*element.data)
 
-        strings.append(SummaryBuilder.DELIMITER)
-        strings.append('|Label                  |Cluster |')
-        strings.append(SummaryBuilder.DELIMITER)
+    def iter_data_lines(self, labels, clusters_id):
+        yield SummaryBuilder.DELIMITER
+        yield '|Label                  |Cluster |'
+        yield SummaryBuilder.DELIMITER
         
         for label, cluster_id in zip(labels, clusters_id):
             # TODO DELETE
@@ -46,20 +77,9 @@ class SummaryBuilder:
             label_string = self._get_spaced_string(23, combined_label)
             id_string = self._get_spaced_string(8, cluster_id)
 
-            strings.append(f'|{label_string}|{id_string}|')
+            yield f'|{label_string}|{id_string}|'
 
-        strings.append(SummaryBuilder.DELIMITER)
-    
-        self.strings.append(self._join('\n', strings)) 
-
-        return self
-    
-    def from_summary_element(self, element):
-        self.with_title(element.title) \
-            .with_kwargs(element.used_kwargs) \
-            .with_data(*element.data) 
-
-        return self
+        yield SummaryBuilder.DELIMITER
     
     def build(self):
         return self._join('\n', self.strings)
@@ -76,18 +96,90 @@ class SummaryBuilder:
         return f'{element}{" " * space_count}'
 
 
+class ReportWriter:
+    """Writes summary elements to a file handle row by row.
+
+    Nothing is kept once a row is written, so the memory used does not grow
+    with the number of labelled functions.
+    """
+
+    EXTENSION = None
+
+    def __init__(self, file):
+        self.file = file
+
+    def _split_label(self, label):
+        # (name, filename) contexts, or a single label string
+        if isinstance(label, (tuple, list)):
+            return label[0], label[1]
+
+        return label, None
+
+
+class TextReportWriter(ReportWriter):
+    EXTENSION = 'txt'
+
+    def __init__(self, file):
+        super().__init__(file)
+        self.summary_builder = SummaryBuilder()
+
+    def write_element(self, element):
+        for line in self.summary_builder.iter_element_lines(element):
+            self.file.write(f'{line}\n')
+
+
+class CsvReportWriter(ReportWriter):
+    EXTENSION = 'csv'
+    HEADER = ['algorithm', 'kwargs', 'name', 'filename', 'cluster']
+
+    def __init__(self, file):
+        super().__init__(file)
+        self.writer = csv.writer(file)
+        self.writer.writerow(CsvReportWriter.HEADER)
+
+    def write_element(self, element):
+        for label, cluster_id in zip(*element.data):
+            name, filename = self._split_label(label)
+            self.writer.writerow([element.title, element.used_kwargs, name, filename, int(cluster_id)])
+
+
+class JsonLinesReportWriter(ReportWriter):
+    EXTENSION = 'jsonl'
+
+    def write_element(self, element):
+        for label, cluster_id in zip(*element.data):
+            name, filename = self._split_label(label)
+            row = {
+                'algorithm': element.title,
+                'kwargs': str(element.used_kwargs),
+                'name': name,
+                'filename': filename,
+                'cluster': int(cluster_id)
+            }
+            self.file.write(f'{json.dumps(row)}\n')
+
+
 class DisplayManager:
     PATH = 'clustering_/results/'
+    REPORT_WRITERS = {'text': TextReportWriter, 'csv': CsvReportWriter, 'jsonl': JsonLinesReportWriter}
 
     # TODO delete parameters
-    def __init__(self, clusters_id, labels):
+    def __init__(self, clusters_id, labels, metrics=None):
         self.clusters_id = clusters_id
         self.labels = labels
         self.zipped_data = list()
+        self.metrics = metrics
 
         self.summary_builder = SummaryBuilder()
     
     def build_summary(self, summary_elements):
+        if self.metrics is not None:
+            with self.metrics.measure('render'):
+                return self._build_summary(summary_elements)
+
+        return self._build_summary(summary_elements)
+
+    def _build_summary(self, summary_elements):
         summary_builder = SummaryBuilder()
         
         for summary_element in summary_elements:
@@ -95,6 +187,42 @@ class DisplayManager:
         
         return summary_builder.build()
     
+    def write_summary(self, summary_elements, file, report_format='text'):
+        # summary_elements may be a generator, each element is written as
+        # soon as it is produced
+        writer = DisplayManager.REPORT_WRITERS[report_format](file)
+
+        for summary_element in summary_elements:
+            self._write_element(writer, summary_element)
+
+    def _write_element(self, writer, summary_element):
+        if self.metrics is None:
+            writer.write_element(summary_element)
+            return
+
+        with self.metrics.measure('render'):
+            writer.write_element(summary_element)
+
+    def save_summary(self, summary_elements, filename=None, report_format='text'):
+        for _ in self.iter_saved_summary(summary_elements, filename, report_format):
+            pass
+
+    def iter_saved_summary(self, summary_elements, filename=None, report_format='text'):
+        # Passes the elements through, each one is written to the saved report
+        # first, so that the same run can also be written elsewhere
+        if filename is None:
+            extension = DisplayManager.REPORT_WRITERS[report_format].EXTENSION
+            filename = f'result-{self._get_date_as_string()}.{extension}'
+
+        self._assert_result_folder_exists()
+        with open(os.path.join(DisplayManager.PATH, filename), 'w', newline='') as file:
+            writer = DisplayManager.REPORT_WRITERS[report_format](file)
+
+            for summary_element in summary_elements:
+                self._write_element(writer, summary_element)
+                file.flush()
+                yield summary_element
+
     def to_summary_element(self, data, title=None, used_kwargs=None):
         return SummaryElement(data, title, used_kwargs)
     
@@ -0,0 +1,140 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import weakref
+
+import numpy as np
+
+from scipy import sparse
+from scipy.spatial.distance import pdist, squareform
+
+
+class DistanceCache:
+    """Condensed pairwise distance matrices keyed by the data and the metric.
+
+    Distances are computed once per vector matrix and stored as float64 in
+    the condensed layout of scipy.spatial.distance.pdist: float32 rounding
+    is enough to change which merges happen at a distance threshold. With a
+    path, each matrix is also saved as a .npy file and memory-mapped, so
+    that other processes and later runs on the same corpus share it.
+    """
+
+    DTYPE = np.float64
+
+    def __init__(self, path=None):
+        self.path = path
+        self._matrices = {}
+        self._shared_path = None
+
+    def __getstate__(self):
+        # Worker processes get the matrices as memory-mapped files, not in
+        # the pickle. Without a path, the ones computed so far are written
+        # to a temporary directory that lives as long as this cache
+        state = self.__dict__.copy()
+        state['_matrices'] = {}
+
+        if self.path is None and self._matrices:
+            state['path'] = self._share()
+
+        return state
+
+    def _share(self):
+        if self._shared_path is None:
+            self._shared_path = tempfile.mkdtemp(prefix='cscv-distances-')
+            weakref.finalize(self, shutil.rmtree, self._shared_path, True)
+
+        for key, matrix in self._matrices.items():
+            if not os.path.exists(self._get_file_path(key, self._shared_path)):
+                self._write(key, matrix, self._shared_path)
+
+        return self._shared_path
+
+    def get_key(self, data, metric='euclidean'):
+        if sparse.issparse(data):
+            data = data.tocsr()
+            hasher = hashlib.sha256(
+                f'{metric}:{self._get_dtype_name()}:csr:{data.dtype.str}:{data.shape}'.encode('utf-8'))
+            for array_ in (data.indptr, data.indices, data.data):
+                hasher.update(np.ascontiguousarray(array_))
+
+            return hasher.hexdigest()
+
+        data = np.ascontiguousarray(data)
+        hasher = hashlib.sha256(
+            f'{metric}:{self._get_dtype_name()}:{data.dtype.str}:{data.shape}'.encode('utf-8'))
+        hasher.update(data)
+
+        return hasher.hexdigest()
+
+    def _get_dtype_name(self):
+        # Part of the key, so that matrices saved with another precision are
+        # not reused
+        return np.dtype(DistanceCache.DTYPE).str
+
+    def get(self, data, metric='euclidean'):
+        key = self.get_key(data, metric)
+        matrix = self._matrices.get(key)
+
+        if matrix is None:
+            matrix = self._load(key)
+
+        if matrix is None:
+            matrix = self._compute(data, metric)
+            matrix = self._save(key, matrix)
+
+        self._matrices[key] = matrix
+        return matrix
+
+    def _compute(self, data, metric):
+        if not sparse.issparse(data):
+            return pdist(np.asarray(data, dtype=np.float64), metric).astype(DistanceCache.DTYPE)
+
+        # pdist only takes dense rows, scikit-learn computes the distances of
+        # sparse rows without densifying them
+        from sklearn.metrics import pairwise_distances
+
+        distances = pairwise_distances(data, metric=metric)
+        return squareform(distances, checks=False).astype(DistanceCache.DTYPE)
+
+    @classmethod
+    def get_prefix(cls, condensed, n_samples, prefix_length):
+        # Condensed distances between the prefix_length first samples only:
+        # the beginning of each of their rows
+        rows = [np.arange(prefix_length - idx - 1) + cls._get_row_start(idx, n_samples)
+            for idx in range(prefix_length - 1)]
+        indexes = np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)
+
+        return condensed[indexes]
+
+    @classmethod
+    def _get_row_start(cls, idx, n_samples):
+        return idx * n_samples - idx * (idx + 1) // 2
+
+    def clear(self):
+        self._matrices = {}
+
+    def _get_file_path(self, key, path=None):
+        return os.path.join(path or self.path, f'{key}.npy')
+
+    def _load(self, key):
+        if self.path is None or not os.path.exists(self._get_file_path(key)):
+            return None
+
+        return np.load(self._get_file_path(key), mmap_mode='r')
+
+    def _save(self, key, matrix):
+        if self.path is None:
+            return matrix
+
+        os.makedirs(self.path, exist_ok=True)
+        self._write(key, matrix, self.path)
+
+        return np.load(self._get_file_path(key), mmap_mode='r')
+
+    def _write(self, key, matrix, path):
+        file_path = self._get_file_path(key, path)
+        tmp_path = f'{file_path}.{os.getpid()}.tmp.npy'
+
+        np.save(tmp_path, matrix)
+        os.replace(tmp_path, file_path)
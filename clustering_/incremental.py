@@ -0,0 +1,63 @@
+import numpy as np
+
+
+class IncrementalSingleLinkage:
+    """Single linkage clustering cut at a distance threshold, fed one point at a time.
+
+    Cutting the single linkage tree at a threshold gives the connected
+    components of the graph linking every pair of points closer than the
+    threshold, so each insertion only has to join the new point with its
+    neighbours (union-find) instead of refitting the whole tree.
+    """
+
+    def __init__(self, distance_threshold):
+        self.distance_threshold = distance_threshold
+        self.points = None # grown by doubling, only the first len(parents) rows are used
+        self.parents = []
+        self.n_clusters_ = 0
+
+    def _find(self, idx):
+        parents = self.parents
+
+        while parents[idx] != idx:
+            parents[idx] = parents[parents[idx]]
+            idx = parents[idx]
+
+        return idx
+
+    def _union(self, first, second):
+        first_root, second_root = self._find(first), self._find(second)
+
+        if first_root != second_root:
+            # The smallest index stays the root so the labels are stable
+            self.parents[max(first_root, second_root)] = min(first_root, second_root)
+            self.n_clusters_ -= 1
+
+    def add(self, point):
+        point = np.asarray(point, dtype=np.float64)
+        idx = len(self.parents)
+
+        if self.points is None:
+            self.points = np.empty((16, point.shape[0]))
+        elif idx == len(self.points):
+            self.points = np.concatenate((self.points, np.empty_like(self.points)))
+
+        self.parents.append(idx)
+        self.n_clusters_ += 1
+
+        if idx:
+            # Same comparison as AgglomerativeClustering: merges at or above
+            # the threshold are cut
+            distances = np.sqrt(((self.points[:idx] - point) ** 2).sum(axis=1))
+            for neighbour in np.flatnonzero(distances < self.distance_threshold):
+                self._union(int(neighbour), idx)
+
+        self.points[idx] = point
+
+        return self
+
+    def get_labels(self):
+        roots = [self._find(idx) for idx in range(len(self.parents))]
+        labels = {}
+
+        return np.asarray([labels.setdefault(root, len(labels)) for root in roots])
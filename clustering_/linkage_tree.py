@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class LinkageTree:
+    """Full agglomerative merge tree, cut at any distance threshold without refitting.
+
+    children and distances are the children_ and distances_ of a fitted
+    AgglomerativeClustering: merge i joins children[i] into node
+    n_leaves + i at height distances[i].
+    """
+
+    def __init__(self, children, distances, n_leaves, linkage=None):
+        self.children = np.asarray(children)
+        self.distances = np.asarray(distances)
+        self.n_leaves = n_leaves
+        self.linkage = linkage
+
+        # The supported linkages merge at non-decreasing heights
+        self._sorted_distances = np.sort(self.distances)
+
+    def count_clusters(self, threshold):
+        # Same rule as AgglomerativeClustering: merges at or above the
+        # threshold are not applied
+        merges = np.searchsorted(self._sorted_distances, threshold, side='left')
+        return self.n_leaves - int(merges)
+
+    def cut(self, threshold):
+        return self._apply_merges(self.n_leaves - self.count_clusters(threshold))
+
+    def cut_n_clusters(self, n_clusters):
+        return self._apply_merges(self.n_leaves - min(n_clusters, self.n_leaves))
+
+    def _apply_merges(self, merges):
+        parents = np.arange(self.n_leaves + merges)
+
+        for idx in range(merges):
+            node = self.n_leaves + idx
+            parents[self.children[idx]] = node
+
+        # Every node points to its parent: following the merge order
+        # backwards gives each leaf its root
+        for node in range(self.n_leaves + merges - 1, -1, -1):
+            parents[node] = parents[parents[node]]
+
+        roots = parents[:self.n_leaves]
+        _, first_seen, labels = np.unique(roots, return_index=True, return_inverse=True)
+
+        # Labels numbered by first appearance
+        order = np.argsort(np.argsort(first_seen))
+        return order[labels]
+
+    def sweep(self, thresholds):
+        counts = [self.count_clusters(threshold) for threshold in thresholds]
+        labels = [self.cut(threshold) for threshold in thresholds]
+
+        return counts, labels
@@ -0,0 +1,95 @@
+import os
+import pickle
+
+import numpy as np
+
+from sklearn.neighbors import KDTree
+
+from parsing.study_manager import StudyManager
+
+
+class SimilarityIndex:
+    """KD-tree over the function vectors, answering "which functions look like this one?".
+
+    labels are the (name, filename) contexts of FunctionOutput.split_context_list,
+    in the same order as the vectors.
+    """
+
+    def __init__(self, labels, vectors, leaf_size=40):
+        self.labels = [tuple(label) for label in labels]
+        self.tree = KDTree(np.asarray(vectors, dtype=np.float64), leaf_size=leaf_size)
+
+        self._indexes = {}
+        for idx, (name, _) in enumerate(self.labels):
+            self._indexes.setdefault(name, []).append(idx)
+
+    @classmethod
+    def from_function_outputs(cls, outputs, leaf_size=40):
+        vectors = [output.vector.to_list() for output in outputs]
+        labels = [output.extract_name_and_filename() for output in outputs]
+
+        return SimilarityIndex(labels, vectors, leaf_size)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def get_index(self, name, filename=None):
+        indexes = [idx for idx in self._indexes.get(name, [])
+            if filename is None or self.labels[idx][1] == filename]
+
+        if not indexes:
+            raise KeyError(name if filename is None else (name, filename))
+
+        return indexes[0]
+
+    def get_vector(self, name, filename=None):
+        return self.tree.data[self.get_index(name, filename)]
+
+    def query(self, vector, k=5):
+        k = min(k, len(self.labels))
+        distances, indexes = self.tree.query(self._to_query(vector), k=k)
+
+        return self._to_results(indexes[0], distances[0])
+
+    def query_radius(self, vector, radius):
+        indexes, distances = self.tree.query_radius(
+            self._to_query(vector), r=radius, return_distance=True, sort_results=True)
+
+        return self._to_results(indexes[0], distances[0])
+
+    def query_name(self, name, k=5, filename=None):
+        idx = self.get_index(name, filename)
+        results = self.query(self.tree.data[idx], k + 1)
+
+        # The function itself is always its own nearest neighbour
+        return [result for result in results if result[0] != self.labels[idx]][:k]
+
+    def query_radius_name(self, name, radius, filename=None):
+        idx = self.get_index(name, filename)
+        results = self.query_radius(self.tree.data[idx], radius)
+
+        return [result for result in results if result[0] != self.labels[idx]]
+
+    def query_snippet(self, text, k=5, study_manager=None):
+        study_manager = study_manager or StudyManager()
+        outputs = study_manager.parse_and_visit(text)
+
+        return {output.name: self.query(output.vector.to_list(), k) for output in outputs}
+
+    def _to_query(self, vector):
+        return np.asarray(vector, dtype=np.float64).reshape(1, -1)
+
+    def _to_results(self, indexes, distances):
+        return [(self.labels[idx], float(distance)) for idx, distance in zip(indexes, distances)]
@@ -1,18 +1,31 @@
-import matplotlib.pyplot as plt
+import argparse
+import os
+import sys
 
 from pprint import pprint
 
-from clustering_.algorithms import AlgorithmManager, AlgorithmElement
 from clustering_.display_manager import DisplayManager
 
-from parsing.vector import Vector
 from parsing.study_manager import StudyManager
+from parsing.error_report import ErrorReport
 from parsing.ast_visitor import FunctionOutput
+from parsing.feature_extractor import HashedFeatureExtractor
+from parsing.name_index import NameIndex
+from parsing.vector_cache import VectorCache
+from parsing.corpus import Corpus
+from parsing.shard import Shard
+
+
+# matplotlib and the clustering_.algorithms stack (scikit-learn, SciPy) are
+# imported by the functions that use them, a parsing run never loads them
+DEFAULT_PATH = './parsing/resources/files'
+ANALYSES = ['compare', 'threshold', 'monitor', 'export']
+MONITOR_LINKAGES = ['single', 'complete', 'average', 'ward']
 
 
 def get_selected_funcs(funcs_names):
     study_manager = StudyManager()
-    study_manager.file_manager.set_default_path('./parsing/resources/files')
+    study_manager.file_manager.set_default_path(DEFAULT_PATH)
     selected_funcs = study_manager.select_from_names(funcs_names)
 
     return selected_funcs
@@ -25,52 +38,125 @@ def filter_funcs(funcs):
     return merged_list
 
 
-def init_data(funcs, vector_summary=False, display_vectors=True):
-    # From data upload to labeled data
-    selected_funcs = get_selected_funcs(funcs)
-    merged_list = filter_funcs(selected_funcs)
-    # FunctionOutput.label_elements(merged_list)
-
+def export_store(store, vector_summary=False, display_vectors=True):
     display_manager = DisplayManager(None, None)
 
-    # Export the content of the vectors
+    # Text views of the vectors, generated from the store
     if vector_summary:
-        text = FunctionOutput.summarize_elements(merged_list)
+        text = '\n'.join(store.export_summary())
         display_manager.save_as_file(text, 'vector-summary.txt')
     
     if display_vectors:
-        vectors = [fnc_outp.vector for fnc_outp in merged_list]
-        text = '\n'.join(f'D{idx}:\n {vector}' for idx, vector in enumerate(vectors))
+        text = '\n'.join(store.export_vectors())
         display_manager.save_as_file(text, 'vectors.txt')
 
-    # Conversion to list of ints
-    vectors, contexts = FunctionOutput.split_context_list(merged_list)
-    vectors_as_list = Vector.vector_list_to_list_of_list(vectors)
 
-    return contexts, vectors_as_list
+def init_data(funcs, vector_summary=False, display_vectors=True, store_path=None):
+    # From data upload to labeled data
+    selected_funcs = get_selected_funcs(funcs)
+    merged_list = filter_funcs(selected_funcs)
+    # FunctionOutput.label_elements(merged_list)
+
+    store = Corpus.from_function_outputs(merged_list)
+
+    if store_path is not None:
+        store.save(store_path)
+
+    export_store(store, vector_summary, display_vectors)
+
+    return store.get_contexts(), store.vectors
+
+
+def stream_data(funcs, labels, jobs=None, read_ahead=8, chunk_size=None):
+    # Pipelined variant of init_data: files are read on a thread, parsed by
+    # the workers and handed out as vector chunks while the next ones are
+    # still parsed. labels is filled as the chunks are consumed
+    study_manager = StudyManager()
+    study_manager.file_manager.set_default_path(DEFAULT_PATH)
+
+    for contexts, vectors in study_manager.iter_vector_chunks(funcs, chunk_size, jobs,
+            read_ahead=read_ahead):
+        labels.extend(contexts)
+        yield vectors
+
+
+def init_sparse_data(funcs, jobs=None):
+    # Hashed subtree and operator n-gram features, as a CSR matrix
+    study_manager = StudyManager(visitor_class=HashedFeatureExtractor)
+    study_manager.file_manager.set_default_path(DEFAULT_PATH)
+    selected_funcs = study_manager.select_from_names(funcs, jobs)
+    merged_list = filter_funcs(selected_funcs)
+
+    labels = [output.extract_name_and_filename() for output in merged_list]
+    return labels, study_manager.visitor.to_csr_matrix(merged_list)
+
+
+def load_data(store_path, vector_summary=False, display_vectors=False):
+    # Memory-mapped vectors of a previous run, nothing is parsed
+    store = Corpus.load(store_path)
+    export_store(store, vector_summary, display_vectors)
+
+    return store.get_contexts(), store.vectors
 
 
-def compare_algorithms(funcs, save_as_file=False):
-    labels, vectors = init_data(funcs)
+def get_data(funcs, store_path=None):
+    return load_data(store_path) if store_path is not None else init_data(funcs)
+
+
+def compare_algorithms(funcs, save_as_file=False, store_path=None, report_format='text'):
+    labels, vectors = get_data(funcs, store_path)
+    _compare_algorithms(labels, vectors, save_as_file, report_format)
+
+def _compare_algorithms(labels, vectors, save_as_file=False, report_format='text'):
+    from clustering_.algorithms import AlgorithmManager
 
     algorithm_manager = AlgorithmManager()
     agglo_kwargs = {'n_clusters': None, 'distance_threshold': 5}
     kmeans_kwargs = {'random_state': 0}
 
-    results = algorithm_manager.compare_algorithms(
+    results = algorithm_manager.iter_compare_algorithms(
         labels, 
         vectors, 
         agglo_kwargs, 
         kmeans_kwargs
     )
     
+    # Each algorithm is written row by row as soon as it is done, instead of
+    # building the whole summary string after the last one
     display_manager = DisplayManager(None, labels)
-    result_as_string = display_manager.build_summary(results)
-    print(result_as_string) 
-
     if save_as_file:
-        display_manager.save_as_file(result_as_string) 
+        results = display_manager.iter_saved_summary(results, report_format=report_format)
+
+    display_manager.write_summary(results, sys.stdout)
     
+def compare_sparse_algorithms(funcs, save_as_file=False, jobs=None, report_format='text'):
+    # Ward is left out, the other algorithms run on the sparse rows
+    labels, vectors = init_sparse_data(funcs, jobs)
+    _compare_algorithms(labels, vectors, save_as_file, report_format)
+
+def stream_clustering(funcs, jobs=None, save_as_file=False, report_format='text'):
+    from clustering_.algorithms import AlgorithmManager, AlgorithmElement
+
+    # Clustering starts with the first chunk instead of after the whole parsing
+    labels = []
+    vectors = stream_data(funcs, labels, jobs)
+
+    algorithm_manager = AlgorithmManager()
+    algorithm_element = AlgorithmElement(
+        algorithm_manager.minibatch_kmeans_clustering,
+        labels,
+        vectors,
+        {'random_state': 0},
+        'Mini-batch Kmeans algorithm'
+    )
+    results = [algorithm_manager.start_algorithm(algorithm_element)]
+
+    display_manager = DisplayManager(None, labels)
+    display_manager.write_summary(results, sys.stdout)
+
+    if save_as_file:
+        display_manager.save_summary(results, report_format=report_format)
+
 def foo():
     study_manager = StudyManager()
     study_manager.file_manager.set_default_path('./parsing/resources/x')
@@ -89,27 +175,35 @@ def foo():
     print(text)
 
 def _display_distance_threshold(results):
-    for algo in results:
+    import matplotlib.pyplot as plt
 
-        length = len(algo['result'])
-        plt.plot(range(1, length + 1), algo['result'], label=f'{algo["linkage"]} linkage')
+    for algo in results:
+        plt.plot(algo['thresholds'], algo['result'], label=f'{algo["linkage"]} linkage')
 
     plt.xlabel('distance_threshold')
     plt.ylabel('nombre de clusters')
     plt.legend()
     plt.show()
 
-def compare_distance_threshold(funcs):
-    labels, vectors = init_data(funcs)
+def compare_distance_threshold(funcs, store_path=None):
+    labels, vectors = get_data(funcs, store_path)
+    _compare_distance_threshold(labels, vectors)
+
+def _compare_distance_threshold(labels, vectors, plot=True):
+    from clustering_.algorithms import AlgorithmManager
+
     algorithm_manager = AlgorithmManager()
 
     results = algorithm_manager.compare_distance_threshold(labels, vectors)
 
-    pprint(results) 
-    _display_distance_threshold(results)
+    pprint([{'linkage': algo['linkage'], 'result': algo['result']} for algo in results])
+    if plot:
+        _display_distance_threshold(results)
 
 
 def _display_cluster_count(clusters):
+    import matplotlib.pyplot as plt
+
     clusters.insert(0, 1)
     length = len(clusters)
 
@@ -119,6 +213,8 @@ def _display_cluster_count(clusters):
     plt.show()
 
 def _plot_cluster_count():
+    import matplotlib.pyplot as plt
+
     length = 15
 
     plt.plot(range(1, length + 1), [1, 1, 2, 2, 3, 3, 3, 3, 4, 4, 4, 5, 5, 6, 6], label='ward')
@@ -128,22 +224,195 @@ def _plot_cluster_count():
     plt.legend()
     plt.show()
 
-def monitor_cluster_evolution(funcs):
-    labels, vectors = init_data(funcs)
-    kwargs = {'n_clusters': None, 'distance_threshold': 5, 'linkage': 'ward'}
+def monitor_cluster_evolution(funcs, store_path=None, linkage='single'):
+    labels, vectors = get_data(funcs, store_path)
+    _monitor_cluster_evolution(labels, vectors, linkage=linkage)
+
+def _monitor_cluster_evolution(labels, vectors, plot=True, linkage='single'):
+    # Single linkage is followed incrementally, the other linkages are
+    # refitted on every prefix
+    kwargs = {'n_clusters': None, 'distance_threshold': 5, 'linkage': linkage}
+
+    from clustering_.algorithms import AlgorithmManager
+
     algorithm_manager = AlgorithmManager()
     display_manager = DisplayManager(None, None)
     text, clusters = algorithm_manager.monitor_cluster_evolution(labels, vectors, kwargs)
 
     print(text)
     print(clusters) 
-    _display_cluster_count(clusters)
+    if plot:
+        _display_cluster_count(clusters)
     display_manager.save_as_file(text, f'monitor-{kwargs["linkage"]}.txt')
 
 
+def _parse_names(value):
+    names = [name for name in value.split(',') if name]
+    if not names:
+        raise argparse.ArgumentTypeError('expected comma-separated function names')
+
+    return names
+
+def _parse_query(value):
+    analysis, _, names = value.partition('=')
+    if analysis not in ANALYSES:
+        raise argparse.ArgumentTypeError(f'unknown analysis {analysis!r}, expected one of {ANALYSES}')
+
+    if not names and analysis != 'export':
+        raise argparse.ArgumentTypeError(f'{analysis} expects function names: {analysis}=NAME[,NAME...]')
+
+    return analysis, _parse_names(names) if names else None
+
+def _get_queries(args):
+    if args.command == 'run':
+        return args.queries
+
+    groups = args.funcs or [None]
+    if args.command != 'export' and groups == [None]:
+        raise SystemExit(f'cscv {args.command}: at least one --funcs group is required')
+
+    return [(args.command, names) for names in groups]
+
+def _get_study_manager(args, error_report=None):
+    cache, name_index = None, None
+    if args.cache_dir is not None:
+        cache = VectorCache(os.path.join(args.cache_dir, 'vectors'))
+        name_index = NameIndex(os.path.join(args.cache_dir, 'names.json'))
+
+    memory_limit = args.memory_limit * 2 ** 20 if args.memory_limit is not None else None
+    study_manager = StudyManager(cache=cache, name_index=name_index, error_report=error_report,
+        timeout=args.timeout, memory_limit=memory_limit)
+    study_manager.file_manager.set_default_path(args.path)
+
+    return study_manager
+
+def _build_store(args, queries, error_report=None):
+    if args.store is not None:
+        return Corpus.load(args.store)
+
+    study_manager = _get_study_manager(args, error_report)
+
+    # One parse for every query: only the files that may define one of the
+    # names of any group, unless a query needs all the functions
+    filenames = None
+    if all(names is not None for _, names in queries):
+        filenames = study_manager.get_files_from_names({name for _, names in queries for name in names})
+
+    # Rows are copied into the corpus file by file, the FunctionOutputs of a
+    # file are dropped as soon as the next one is parsed
+    files_output = study_manager.iter_files_output(args.jobs, filenames=filenames)
+    return Corpus.from_files_output(files_output)
+
+def _run_query(args, store, analysis, names):
+    if names is not None:
+        store = store.select(names)
+
+    print(f'== {analysis}: {", ".join(names) if names else "all functions"} ({len(store)} functions)')
+    # Clustering needs at least two functions, a lone one is only reported
+    if not len(store) or (analysis != 'export' and len(store) < 2):
+        return
+
+    if analysis == 'export':
+        export_store(store, args.summary, True)
+        if args.output is not None:
+            store.save(args.output)
+        return
+
+    labels, vectors = store.get_contexts(), store.vectors
+    if analysis == 'compare':
+        _compare_algorithms(labels, vectors, args.save, args.report_format)
+    elif analysis == 'threshold':
+        _compare_distance_threshold(labels, vectors, not args.no_plot)
+    elif analysis == 'monitor':
+        _monitor_cluster_evolution(labels, vectors, not args.no_plot, args.linkage)
+
+def _write_error_report(args, error_report):
+    # Files that failed were skipped, the run goes on with the others
+    if error_report.failures or error_report.slow_files:
+        print(f'Parsing: {error_report.summary()}', file=sys.stderr)
+        for failure in error_report.failures:
+            print(f'  {failure["filename"]}: {failure["kind"]}: {failure["message"]}', file=sys.stderr)
+
+    if args.error_report is not None:
+        error_report.save(args.error_report)
+
+def _run_shard(args, error_report):
+    if args.files is not None:
+        with open(args.files, 'r') as file:
+            shard = Shard(filenames=[line.strip() for line in file if line.strip()])
+    else:
+        shard = Shard.from_index(args.index, args.count)
+
+    corpus = _get_study_manager(args, error_report).process_shard(shard, args.output, args.jobs)
+    _write_error_report(args, error_report)
+    print(f'{len(corpus)} functions from {len(corpus.filenames)} files saved to {args.output}')
+
+def _run_merge(args):
+    corpus = Shard.merge(args.shards, args.output)
+    print(f'{len(corpus)} functions from {len(args.shards)} shards saved to {args.output}')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='cscv', description='Cluster C functions from their syntax vectors')
+    parser.add_argument('--path', default=DEFAULT_PATH, help='directory of the C sources')
+    parser.add_argument('--jobs', type=int, help='worker processes used to parse the files')
+    parser.add_argument('--cache-dir', help='directory of the vector cache and name index')
+    parser.add_argument('--store', help='vector store of a previous export, nothing is parsed')
+    parser.add_argument('--no-plot', action='store_true')
+    parser.add_argument('--save', action='store_true', help='write the summaries to clustering_/results')
+    parser.add_argument('--report-format', choices=list(DisplayManager.REPORT_WRITERS), default='text',
+        help='format of the saved summaries')
+    parser.add_argument('--timeout', type=float, help='seconds after which the parse of a file is abandoned')
+    parser.add_argument('--memory-limit', type=int, help='address space limit of a parsing worker, in MB')
+    parser.add_argument('--slow', type=float, help='report the files whose parse takes more seconds')
+    parser.add_argument('--error-report', help='JSON file the failed and slow files are written to')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for analysis in ANALYSES:
+        subparser = subparsers.add_parser(analysis)
+        subparser.add_argument('-f', '--funcs', type=_parse_names, action='append',
+            help='comma-separated function names, repeat for several groups')
+
+    export_parser = subparsers.choices['export']
+    export_parser.add_argument('--summary', action='store_true', help='also write vector-summary.txt')
+    export_parser.add_argument('--output', help='directory the vector store is saved to')
+
+    run_parser = subparsers.add_parser('run', help='several analyses off a single parse')
+    run_parser.add_argument('queries', nargs='+', type=_parse_query, metavar='ANALYSIS[=NAMES]',
+        help=f'one of {ANALYSES}, with comma-separated function names')
+    run_parser.add_argument('--summary', action='store_true')
+    run_parser.add_argument('--output')
+
+    for subparser in (subparsers.choices['monitor'], run_parser):
+        subparser.add_argument('--linkage', choices=MONITOR_LINKAGES, default='single',
+            help='linkage of the monitor analysis, only single is incremental')
+
+    shard_parser = subparsers.add_parser('shard', help='parse a part of the files into a partial store')
+    shard_parser.add_argument('--index', type=int, default=0, help='index of the hash range, from 0')
+    shard_parser.add_argument('--count', type=int, default=1, help='number of hash ranges')
+    shard_parser.add_argument('--files', help='file listing the relative paths of the shard instead')
+    shard_parser.add_argument('--output', required=True, help='directory of the partial store')
+
+    merge_parser = subparsers.add_parser('merge', help='combine partial stores into one')
+    merge_parser.add_argument('shards', nargs='+', help='directories written by shard')
+    merge_parser.add_argument('--output', required=True, help='directory of the merged store')
+
+    args = parser.parse_args(argv)
+
+    error_report = ErrorReport(args.slow)
+
+    if args.command == 'shard':
+        return _run_shard(args, error_report)
+    if args.command == 'merge':
+        return _run_merge(args)
+
+    queries = _get_queries(args)
+    store = _build_store(args, queries, error_report)
+    if args.store is None:
+        _write_error_report(args, error_report)
+
+    for analysis, names in queries:
+        _run_query(args, store, analysis, names)
+
+
 if __name__ == '__main__':
-    # compare_algorithms(['trier_piles', 'trier_piles_2'], False)
-    # compare_distance_threshold(['trier_piles', 'trier_piles_2'])
-    # foo()
-    # monitor_cluster_evolution(['trier_piles', 'trier_piles_2'])
-    _plot_cluster_count()
\ No newline at end of file
+    sys.exit(main())
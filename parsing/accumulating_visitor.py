@@ -0,0 +1,141 @@
+import time
+
+from pycparser import c_ast
+
+from parsing.logger import get_logger
+from parsing.vector import Vector, SyntaxToken
+from parsing.ast_visitor import FunctionOutput
+
+
+def _push_children(node, attributes, stack):
+    for attribute in attributes:
+        child = getattr(node, attribute)
+
+        if child is None:
+            continue
+
+        if isinstance(child, list):
+            stack.extend(child)
+        else:
+            stack.append(child)
+
+
+def _counter(tokens=(), op_attribute=None, children=()):
+    indexes = tuple(token.value for token in tokens)
+
+    def count(node, values, stack):
+        for idx in indexes:
+            values[idx] += 1
+
+        if op_attribute is not None:
+            idx = AccumulatingVisitor.OP_INDEXES.get(getattr(node, op_attribute))
+            if idx is not None:
+                values[idx] += 1
+
+        _push_children(node, children, stack)
+
+    return count
+
+
+def _count_func_call(node, values, stack):
+    values[SyntaxToken.FUNC_CALL.value] += 1
+
+    # Only the ExprList of a call is walked, anywhere else it is ignored
+    if node.args is not None:
+        stack.extend(node.args.exprs)
+
+
+def _count_if(node, values, stack):
+    values[SyntaxToken.IF.value] += 1
+
+    if node.iffalse is not None:
+        values[SyntaxToken.ELSE.value] += 1
+
+    _push_children(node, ('cond', 'iftrue', 'iffalse'), stack)
+
+
+class AccumulatingVisitor:
+    """Iterative counterpart of ASTVisitor.
+
+    Each FuncDef is walked once with an explicit stack and every token is
+    counted straight into a single Vector. The node types and children taken
+    into account are the ones ASTVisitor merges, any other node (and its
+    subtree) is skipped.
+    """
+
+    # Same vectors as ASTVisitor, so the same VectorCache entries
+    FEATURE_SPACE = 'syntax_tokens'
+    OP_INDEXES = {op: token.value for op, token in Vector.syntax_map.items()}
+
+    DISPATCH_TABLE = {
+        c_ast.Compound: _counter(children=('block_items',)),
+        c_ast.ParamList: _counter(children=('params',)),
+        c_ast.Cast: _counter((SyntaxToken.CAST,), children=('expr', 'to_type')),
+        c_ast.Decl: _counter(children=('type',)),
+        c_ast.TypeDecl: _counter((SyntaxToken.TYPE_DECL,)),
+        c_ast.PtrDecl: _counter((SyntaxToken.PTR_DECL,), children=('type',)),
+        c_ast.ArrayDecl: _counter((SyntaxToken.ARR_DECL,), children=('type', 'dim')),
+        c_ast.ArrayRef: _counter(children=('name', 'subscript')),
+        c_ast.StructRef: _counter(op_attribute='type', children=('field',)),
+        c_ast.BinaryOp: _counter(op_attribute='op', children=('left', 'right')),
+        c_ast.Assignment: _counter(op_attribute='op', children=('lvalue', 'rvalue')),
+        c_ast.UnaryOp: _counter(op_attribute='op', children=('expr',)),
+        c_ast.Return: _counter(children=('expr',)),
+        c_ast.FuncCall: _count_func_call,
+        c_ast.If: _count_if,
+        c_ast.DeclList: _counter(children=('decls',)),
+        c_ast.For: _counter((SyntaxToken.FOR,), children=('init', 'cond', 'next', 'stmt')),
+        c_ast.While: _counter((SyntaxToken.WHILE,), children=('cond', 'stmt')),
+        c_ast.DoWhile: _counter((SyntaxToken.DO_WHILE,), children=('cond', 'stmt')),
+    }
+
+    def __init__(self, logging=False, metrics=None):
+        self.logger = get_logger(__name__)
+        self.logging = logging
+        self.metrics = metrics
+
+    def visit(self, node):
+        func_def = [self.visit_FuncDef(child) for child in node.ext
+            if isinstance(child, c_ast.FuncDef)]
+
+        if self.logging:
+            for func in func_def:
+                self.logger.debug(f'{func.name}: \n{func.vector.summary()}')
+
+        return func_def
+
+    def visit_FuncDef(self, node):
+        dispatch_table = AccumulatingVisitor.DISPATCH_TABLE
+        vector = Vector()
+        values = vector.values
+
+        stack = [node.body]
+        params = node.decl.type.args
+        if params:
+            stack.append(params)
+
+        if self.metrics is not None:
+            self._measured_walk(stack, values)
+        else:
+            while stack:
+                current = stack.pop()
+                count = dispatch_table.get(type(current))
+
+                if count is not None:
+                    count(current, values, stack)
+
+        return FunctionOutput(node.decl.name, vector)
+
+    def _measured_walk(self, stack, values):
+        dispatch_table = AccumulatingVisitor.DISPATCH_TABLE
+        add_node = self.metrics.add_node
+
+        while stack:
+            current = stack.pop()
+            count = dispatch_table.get(type(current))
+            start = time.perf_counter()
+
+            if count is not None:
+                count(current, values, stack)
+
+            add_node(type(current).__name__, time.perf_counter() - start)
@@ -1,3 +1,5 @@
+import time
+
 from pycparser.c_ast import NodeVisitor, FuncDef
 from pycparser.c_parser import CParser
 
@@ -52,11 +54,16 @@ class FunctionOutput:
 
 
 class ASTVisitor(NodeVisitor):
-    def __init__(self, logging=False):
+    # Key of its vectors in a VectorCache
+    FEATURE_SPACE = 'syntax_tokens'
+
+    def __init__(self, logging=False, metrics=None):
         self.logger = get_logger(__name__)
         self.stack_id = 0
         self._get_type_name = lambda node_: type(node_).__name__
         self.logging = logging
+        self.metrics = metrics
+        self._children_time = []
 
     def visit(self, node):
         if self.logging:
@@ -64,13 +71,31 @@ class ASTVisitor(NodeVisitor):
             self.stack_id += 1
             self.logger.debug(f'Visiting {self._get_type_name(node)} - {stack_id}')
 
-        result = super().visit(node)
+        if self.metrics is not None:
+            result = self._measured_visit(node)
+        else:
+            result = super().visit(node)
 
         if self.logging:
             self.logger.debug(f'Result type: {self._get_type_name(result)} - {stack_id}')
 
         return result
 
+    def _measured_visit(self, node):
+        # Time spent in the node itself, its children are measured on their own
+        self._children_time.append(0)
+        start = time.perf_counter()
+
+        result = super().visit(node)
+
+        elapsed = time.perf_counter() - start
+        children_time = self._children_time.pop()
+        if self._children_time:
+            self._children_time[-1] += elapsed
+
+        self.metrics.add_node(self._get_type_name(node), elapsed - children_time)
+        return result
+
     def visit_FileAST(self, node):
         func_def = [self.visit(child) for child in node.ext if isinstance(child, FuncDef)]
 
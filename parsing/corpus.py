@@ -0,0 +1,174 @@
+import os
+
+from array import array
+
+from parsing.ast_visitor import FunctionOutput
+from parsing.vector import Vector, SyntaxToken
+from parsing.vector_store import VectorStore
+
+
+class NameColumn:
+    """Dictionary-encoded function names.
+
+    Each distinct name is stored once in table, rows hold an int32 code
+    into it. Indexing and slicing behave like the list of names.
+    """
+
+    __slots__ = ('table', 'codes')
+
+    TYPECODE = 'i'
+
+    def __init__(self, table, codes):
+        self.table = table
+        self.codes = codes
+
+    @classmethod
+    def encode(cls, names):
+        table, codes_by_name = [], {}
+        codes = array(NameColumn.TYPECODE)
+
+        for name in names:
+            codes.append(cls._get_code(name, table, codes_by_name))
+
+        return NameColumn(table, codes)
+
+    @classmethod
+    def _get_code(cls, name, table, codes_by_name):
+        code = codes_by_name.get(name)
+
+        if code is None:
+            code = len(table)
+            table.append(name)
+            codes_by_name[name] = code
+
+        return code
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.table[code] for code in self.codes[idx]]
+
+        return self.table[self.codes[idx]]
+
+    def __iter__(self):
+        return (self.table[code] for code in self.codes)
+
+
+class FunctionView(FunctionOutput):
+    """FunctionOutput API over one row of a Corpus.
+
+    Name, filename and vector are read from the corpus arrays when accessed.
+    Assigning one of them (FileOutput.set_filename, view.vector += other)
+    overrides it for this view only, the corpus is left unchanged. The
+    vector is built once, so in-place updates to it are kept too.
+    """
+
+    # Class-level defaults: a view holds no override until one is assigned
+    _name = None
+    _filename = None
+    _vector = None
+
+    def __init__(self, corpus, idx, label=None):
+        self.corpus = corpus
+        self.idx = idx
+        self.label = label
+
+    @property
+    def name(self):
+        return self._name if self._name is not None else self.corpus.names[self.idx]
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+
+    @property
+    def filename(self):
+        return self._filename if self._filename is not None else self.corpus.get_filename(self.idx)
+
+    @filename.setter
+    def filename(self, filename):
+        self._filename = filename
+
+    @property
+    def vector(self):
+        if self._vector is None:
+            self._vector = Vector(self.corpus.vectors[self.idx].tolist())
+
+        return self._vector
+
+    @vector.setter
+    def vector(self, vector):
+        self._vector = vector
+
+
+class Corpus(VectorStore):
+    """Struct-of-arrays corpus: one int32 vector matrix, names as a NameColumn
+    and filenames once per file (see VectorStore).
+
+    from_files_output copies the rows of each FileOutput as they come, so
+    no FunctionOutput has to be kept, and get_function_output returns
+    FunctionView objects.
+    """
+
+    NAMES_FILENAME = 'names.npy'
+
+    def __init__(self, vectors, names, filenames, offsets):
+        if not isinstance(names, NameColumn):
+            names = NameColumn.encode(names)
+
+        super().__init__(vectors, names, filenames, offsets)
+
+    @classmethod
+    def from_files_output(cls, files_output):
+        import numpy as np
+
+        buffer = bytearray()
+        table, codes_by_name = [], {}
+        codes = array(NameColumn.TYPECODE)
+        filenames, offsets = [], []
+
+        for file_output in files_output:
+            if not file_output.funcs_outputs:
+                continue
+
+            filenames.append(file_output.filename)
+            offsets.append(len(codes))
+
+            # Narrowed to int32 file by file, the int64 rows of the whole
+            # corpus never exist at once
+            rows = bytearray().join(output.vector.values for output in file_output.funcs_outputs)
+            buffer += np.frombuffer(rows, dtype=np.int64).astype(Corpus.DTYPE).tobytes()
+
+            for output in file_output.funcs_outputs:
+                codes.append(NameColumn._get_code(output.name, table, codes_by_name))
+
+        offsets.append(len(codes))
+        vectors = np.frombuffer(buffer, dtype=Corpus.DTYPE).reshape(-1, len(SyntaxToken))
+
+        return cls(vectors, NameColumn(table, codes), filenames, offsets)
+
+    @classmethod
+    def _load_names(cls, path, labels, mmap=True):
+        if 'names' in labels:
+            return NameColumn.encode(labels['names'])
+
+        import numpy as np
+
+        codes = np.load(os.path.join(path, labels['names_filename']), mmap_mode='r' if mmap else None)
+        return NameColumn(labels['name_table'], codes)
+
+    def _save_names(self, path):
+        import numpy as np
+
+        np.save(os.path.join(path, Corpus.NAMES_FILENAME), np.asarray(self.names.codes, dtype=np.int32))
+        return {'name_table': self.names.table, 'names_filename': Corpus.NAMES_FILENAME}
+
+    def get_function_output(self, idx):
+        return FunctionView(self, idx)
+
+    def split_context(self):
+        # Counterpart of FunctionOutput.split_context_list, with the vectors
+        # as the matrix itself
+        return [self.vectors, self.get_contexts()]
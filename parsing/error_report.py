@@ -0,0 +1,83 @@
+import os
+import json
+import threading
+
+from parsing.isolated_executor import FileTimeout, WorkerCrashed
+
+
+class ErrorReport:
+    """Files that could not be processed, and files slower than slow_threshold.
+
+    A StudyManager with a report records each failing file here and goes on
+    with the others, instead of letting the first exception end the run.
+    Files that cannot be read or decoded are recorded with the kind 'read'.
+    """
+
+    KINDS = {FileTimeout: 'timeout', WorkerCrashed: 'crash', MemoryError: 'memory'}
+
+    def __init__(self, slow_threshold=None):
+        self.slow_threshold = slow_threshold # seconds
+        self.failures = []
+        self.slow_files = []
+        self.files_count = 0
+        # Read errors are recorded from the read-ahead thread
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.failures)
+
+    def add_failure(self, filename, error, kind=None):
+        failure = {
+            'filename': filename,
+            'kind': kind or self._get_kind(error),
+            'error': type(error).__name__,
+            'message': str(error)
+        }
+
+        with self._lock:
+            self.files_count += 1
+            self.failures.append(failure)
+
+    def add_success(self, filename, seconds):
+        with self._lock:
+            self.files_count += 1
+
+            if self.slow_threshold is not None and seconds > self.slow_threshold:
+                self.slow_files.append({'filename': filename, 'seconds': seconds})
+
+    def _get_kind(self, error):
+        for error_class, kind in ErrorReport.KINDS.items():
+            if isinstance(error, error_class):
+                return kind
+
+        return 'error'
+
+    def summary(self):
+        kinds = {}
+        for failure in self.failures:
+            kinds[failure['kind']] = kinds.get(failure['kind'], 0) + 1
+
+        details = ', '.join(f'{count} {kind}' for kind, count in sorted(kinds.items()))
+        text = f'{len(self.failures)} of {self.files_count} file(s) failed'
+
+        return f'{text} ({details}), {len(self.slow_files)} slow' if details \
+            else f'{text}, {len(self.slow_files)} slow'
+
+    def to_dict(self):
+        return {
+            'files': self.files_count,
+            'slow_threshold': self.slow_threshold,
+            'failures': self.failures,
+            'slow_files': self.slow_files
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(path, 'w') as file:
+            file.write(self.to_json())
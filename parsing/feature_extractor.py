@@ -0,0 +1,155 @@
+import zlib
+
+from array import array
+
+from pycparser import c_ast
+
+from parsing.logger import get_logger
+from parsing.ast_visitor import FunctionOutput
+
+
+class SparseVector:
+    __slots__ = ('indices', 'counts')
+
+    TYPECODE = 'q'
+
+    def __init__(self, counts=None):
+        # counts: feature index -> count, stored sorted by index as in a CSR row
+        counts = counts or {}
+        indices = sorted(counts)
+
+        self.indices = array(SparseVector.TYPECODE, indices)
+        self.counts = array(SparseVector.TYPECODE, (counts[idx] for idx in indices))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def to_dict(self):
+        return dict(zip(self.indices, self.counts))
+
+    @classmethod
+    def to_csr_matrix(cls, vectors, n_features):
+        import numpy as np
+        from scipy import sparse
+
+        indptr, indices, counts = [0], array(SparseVector.TYPECODE), array(SparseVector.TYPECODE)
+
+        for vector in vectors:
+            indices.extend(vector.indices)
+            counts.extend(vector.counts)
+            indptr.append(len(indices))
+
+        data = np.frombuffer(counts, dtype=np.int64).astype(np.float64)
+        return sparse.csr_matrix((data, np.frombuffer(indices, dtype=np.int64), np.asarray(indptr)),
+            shape=(len(indptr) - 1, n_features))
+
+    def __str__(self):
+        return str(self.to_dict())
+
+    def __repr__(self):
+        return str(self.to_dict())
+
+
+class HashedFeatureExtractor:
+    """Hashed AST-subtree and operator n-gram features of each function.
+
+    Every node adds its type path with up to path_length - 1 ancestors
+    (For, Compound/For, Assignment[+=]/Compound/For...). The operators met
+    in pre-order add their n-grams of up to ngram_size. Each feature is
+    hashed with crc32 into n_features slots, so the width does not depend
+    on the corpus and rows stay sparse.
+
+    It can be used as the visitor_class of a StudyManager: the vectors of
+    its FunctionOutputs are SparseVectors, which VectorCache and VectorStore
+    do not hold. It has no FEATURE_SPACE, so a StudyManager never caches
+    its outputs.
+    """
+
+    FEATURE_SPACE = None
+    N_FEATURES = 2 ** 18
+    PATH_LENGTH = 3
+    NGRAM_SIZE = 3
+
+    OP_ATTRIBUTES = {
+        c_ast.BinaryOp: 'op',
+        c_ast.UnaryOp: 'op',
+        c_ast.Assignment: 'op',
+        c_ast.StructRef: 'type',
+    }
+
+    def __init__(self, logging=False, metrics=None, n_features=None, path_length=None, ngram_size=None):
+        self.logger = get_logger(__name__)
+        self.logging = logging
+        self.metrics = metrics
+        self.n_features = n_features or HashedFeatureExtractor.N_FEATURES
+        self.path_length = path_length or HashedFeatureExtractor.PATH_LENGTH
+        self.ngram_size = ngram_size or HashedFeatureExtractor.NGRAM_SIZE
+
+        self._indexes = {} # feature tuple -> hashed index
+        self._path_indexes = {} # node type path -> indexes of all its suffixes
+
+    def visit(self, node):
+        func_def = [self.visit_FuncDef(child) for child in node.ext
+            if isinstance(child, c_ast.FuncDef)]
+
+        if self.logging:
+            for func in func_def:
+                self.logger.debug(f'{func.name}: {len(func.vector)} features')
+
+        return func_def
+
+    def visit_FuncDef(self, node):
+        counts = {}
+        operators = []
+        stack = [(node.body, ())]
+        params = node.decl.type.args
+        if params:
+            stack.append((params, ()))
+
+        while stack:
+            current, ancestors = stack.pop()
+            path = (*ancestors, self._get_label(current, operators))[-self.path_length:]
+            indexes = self._path_indexes.get(path)
+
+            if indexes is None:
+                indexes = tuple(self._get_index(path[start:]) for start in range(len(path)))
+                self._path_indexes[path] = indexes
+
+            for idx in indexes:
+                counts[idx] = counts.get(idx, 0) + 1
+
+            # Reversed so that children are popped in source order
+            children = current.children()
+            stack.extend((child, path) for _, child in reversed(children))
+
+        for size in range(2, self.ngram_size + 1):
+            for start in range(len(operators) - size + 1):
+                idx = self._get_index(('op', *operators[start:start + size]))
+                counts[idx] = counts.get(idx, 0) + 1
+
+        return FunctionOutput(node.decl.name, SparseVector(counts))
+
+    def to_csr_matrix(self, function_outputs):
+        return SparseVector.to_csr_matrix((output.vector for output in function_outputs), self.n_features)
+
+    def _get_label(self, node, operators):
+        node_class = type(node)
+        attribute = HashedFeatureExtractor.OP_ATTRIBUTES.get(node_class)
+
+        if attribute is None:
+            return node_class.__name__
+
+        op = getattr(node, attribute)
+        operators.append(op)
+
+        return f'{node_class.__name__}[{op}]'
+
+    def _get_index(self, feature):
+        idx = self._indexes.get(feature)
+
+        # crc32 rather than hash(), which changes from one process to another
+        if idx is None:
+            idx = zlib.crc32('/'.join(feature).encode('utf-8')) % self.n_features
+            self._indexes[feature] = idx
+
+        return idx
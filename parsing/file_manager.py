@@ -1,8 +1,15 @@
 import os
+import fnmatch
 
 
 class FileManager:
     PATH = './resources/files'
+    INCLUDE = ('*.c',)
+
+    def __init__(self, include=None, exclude=None, recursive=True):
+        self.include = include or FileManager.INCLUDE
+        self.exclude = exclude or ()
+        self.recursive = recursive
     
     def read_file(self, filename):
         with open(filename, 'r') as file:
@@ -11,17 +18,34 @@ class FileManager:
         text = '\n'.join(self._exclude_headers(lines))
         return text
 
-    def load_directory(self, path=None):
+    def list_files(self, path=None):
+        return self._list_files(path)
+
+    def iter_directory(self, path=None, filenames=None, on_error=None):
         if path is None:
             path = FileManager.PATH
 
-        c_files = self._list_files(path)
+        if filenames is None:
+            filenames = self._list_files(path)
+
+        # Files are read one at a time, only when the consumer asks for them.
+        # With on_error, a file that cannot be read or decoded is handed to
+        # it and skipped instead of ending the iteration
+        for filename in filenames:
+            try:
+                text = self.read_file(os.path.join(path, filename))
+            except (OSError, UnicodeDecodeError) as error:
+                if on_error is None:
+                    raise
+                on_error(filename, error)
+                continue
 
+            yield filename, text
+
+    def load_directory(self, path=None):
         files_content, files_name = [], []
-        for filename in c_files:
-            file_content = self.read_file(FileManager.get_full_path(filename))
-            file_name = filename
 
+        for file_name, file_content in self.iter_directory(path):
             files_content.append(file_content)
             files_name.append(file_name)
 
@@ -33,21 +57,43 @@ class FileManager:
     def _assert_directory_exists(self, path):
         if not os.path.exists(path):
             raise FileNotFoundError
+
+    def _matches(self, relative_path, patterns):
+        basename = os.path.basename(relative_path)
+        return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(basename, pattern)
+            for pattern in patterns)
+
+    def _is_selected(self, relative_path):
+        return self._matches(relative_path, self.include) \
+            and not self._matches(relative_path, self.exclude)
         
-    def _is_c_file(self, file):
-        return file and file.split('.')[-1] == 'c'
-        
-    def _list_files(self, filename, path=None):
+    def _list_files(self, path=None):
         if path is None:
             path = FileManager.PATH
 
         self._assert_directory_exists(path)
 
-        with os.scandir(path) as dir_content:
-            files = [entry.name for entry in dir_content] 
-            c_files = filter(self._is_c_file, files)
-        
-        return list(c_files)
+        for directory, dirs, files in os.walk(path):
+            relative_directory = os.path.relpath(directory, path)
+            relative_directory = '' if relative_directory == '.' else relative_directory
+
+            # Sorted in place so that os.walk visits the tree in a stable order
+            # and excluded directories are never entered
+            dirs[:] = sorted(dir_ for dir_ in dirs if self.recursive
+                and not self._matches(os.path.join(relative_directory, dir_), self.exclude))
+
+            for file in sorted(files):
+                relative_path = os.path.join(relative_directory, file)
+
+                if self._is_selected(relative_path):
+                    yield relative_path
+
+    @classmethod
+    def get_walk_key(cls, relative_path):
+        # Sorting relative paths by this key gives the order of _list_files:
+        # the files of a directory, then each of its subdirectories in turn
+        parts = relative_path.split(os.sep)
+        return tuple(parts[:-1]), parts[-1]
 
     @classmethod
     def set_default_path(cls, path):
@@ -55,4 +101,4 @@ class FileManager:
     
     @classmethod
     def get_full_path(cls, filename):
-        return os.path.join(cls.PATH, filename)
\ No newline at end of file
+        return os.path.join(cls.PATH, filename)
@@ -0,0 +1,161 @@
+import queue
+import threading
+import multiprocessing
+
+from concurrent.futures import Executor, Future
+
+
+class FileTimeout(Exception):
+    pass
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+def _isolated_worker(connection, memory_limit=None, initializer=None, initargs=()):
+    # Address space cap of the worker process: an allocation above it raises
+    # MemoryError in the task instead of growing until the machine swaps
+    if memory_limit is not None:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    # The start-up work is done before the first task is sent, so it does
+    # not count in the timeout of that task
+    if initializer is not None:
+        initializer(*initargs)
+    connection.send(None)
+
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+
+        if task is None:
+            return
+
+        func, args, kwargs = task
+        try:
+            result = (True, func(*args, **kwargs))
+        except Exception as error:
+            result = (False, error)
+
+        try:
+            connection.send(result)
+        except Exception as error:
+            # The result or the exception could not be pickled
+            connection.send((False, WorkerCrashed(f'unsendable result: {error!r}')))
+
+
+class IsolatedExecutor(Executor):
+    """Executor running each task in a supervised worker process.
+
+    Every slot owns one process and a thread that waits for its result.
+    A task running longer than timeout gets FileTimeout, and its process
+    is killed. A process that dies (segfault, out-of-memory kill) gives
+    WorkerCrashed. In both cases the slot starts a new process for the
+    next task, so one bad task never takes the others down with it.
+    """
+
+    def __init__(self, max_workers=1, timeout=None, memory_limit=None, initializer=None, initargs=()):
+        self.timeout = timeout
+        self.memory_limit = memory_limit # bytes
+        self.initializer = initializer
+        self.initargs = initargs
+
+        self._tasks = queue.Queue()
+        self._context = multiprocessing.get_context()
+        self._slots = [threading.Thread(target=self._run_slot, daemon=True)
+            for _ in range(max_workers)]
+
+        for slot in self._slots:
+            slot.start()
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        self._tasks.put((future, fn, args, kwargs))
+
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        if cancel_futures:
+            while True:
+                try:
+                    item = self._tasks.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[0].cancel()
+
+        for _ in self._slots:
+            self._tasks.put(None)
+
+        if wait:
+            for slot in self._slots:
+                slot.join()
+
+    def _run_slot(self):
+        process, connection = None, None
+
+        while True:
+            item = self._tasks.get()
+            if item is None:
+                break
+
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            if process is None:
+                try:
+                    process, connection = self._start_process()
+                except WorkerCrashed as error:
+                    future.set_exception(error)
+                    continue
+
+            try:
+                connection.send((fn, args, kwargs))
+                ready = connection.poll(self.timeout)
+                if ready:
+                    succeeded, value = connection.recv()
+            except (EOFError, OSError):
+                process.join()
+                future.set_exception(WorkerCrashed(f'worker exited with code {process.exitcode}'))
+                process, connection = None, None
+                continue
+
+            if not ready:
+                self._stop_process(process, connection)
+                future.set_exception(FileTimeout(f'no result after {self.timeout}s'))
+                process, connection = None, None
+            elif succeeded:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+        if process is not None:
+            connection.send(None)
+            process.join()
+
+    def _start_process(self):
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(target=_isolated_worker,
+            args=(worker_connection, self.memory_limit, self.initializer, self.initargs), daemon=True)
+        process.start()
+
+        # Only the worker holds its end, so that its exit is seen as EOF
+        worker_connection.close()
+
+        try:
+            connection.recv()
+        except EOFError:
+            process.join()
+            raise WorkerCrashed(f'worker exited with code {process.exitcode} while starting')
+
+        return process, connection
+
+    def _stop_process(self, process, connection):
+        process.kill()
+        process.join()
+        connection.close()
@@ -5,6 +5,10 @@ def get_logger(name):
     logger = logging.getLogger(name)
     logger.setLevel(logging.DEBUG)
 
+    # Loggers are shared by name: the handler is only attached once
+    if logger.handlers:
+        return logger
+
     ch = logging.StreamHandler()
     ch.setLevel(logging.DEBUG)
 
@@ -12,4 +16,4 @@ def get_logger(name):
     ch.setFormatter(formatter)
     logger.addHandler(ch)
 
-    return logger
\ No newline at end of file
+    return logger
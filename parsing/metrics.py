@@ -0,0 +1,114 @@
+import os
+import json
+import time
+
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Counts and cumulated seconds per pipeline stage, file, AST node type and algorithm.
+
+    Instrumented classes take a metrics=None argument and skip every
+    measurement when it is left to None, so the disabled path costs nothing.
+    """
+
+    STAGE, FILE, NODE, ALGORITHM = 'stage', 'file', 'node', 'algorithm'
+    PREFIX = 'cscv'
+
+    def __init__(self):
+        self.series = {} # (kind, key) -> [count, seconds]
+
+    def add(self, kind, key, seconds, count=1):
+        entry = self.series.get((kind, key))
+
+        if entry is None:
+            self.series[(kind, key)] = [count, seconds]
+        else:
+            entry[0] += count
+            entry[1] += seconds
+
+    def add_stage(self, stage, seconds, filename=None):
+        self.add(Metrics.STAGE, stage, seconds)
+
+        if filename is not None:
+            self.add(Metrics.FILE, (filename, stage), seconds)
+
+    def add_node(self, node_type, seconds):
+        self.add(Metrics.NODE, node_type, seconds)
+
+    def add_algorithm(self, title, seconds):
+        self.add(Metrics.ALGORITHM, title, seconds)
+        self.add(Metrics.STAGE, 'cluster', seconds)
+
+    @contextmanager
+    def measure(self, stage, filename=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(stage, time.perf_counter() - start, filename)
+
+    def merge(self, other):
+        for (kind, key), (count, seconds) in other.series.items():
+            self.add(kind, key, seconds, count)
+
+        return self
+
+    def get(self, kind):
+        return {key: tuple(entry) for (kind_, key), entry in self.series.items() if kind_ == kind}
+
+    def to_dict(self):
+        def entries(kind, key_names):
+            rows = []
+            for key, (count, seconds) in sorted(self.get(kind).items(), key=lambda item: -item[1][1]):
+                keys = key if isinstance(key, tuple) else (key,)
+                rows.append({**dict(zip(key_names, keys)), 'count': count, 'seconds': seconds})
+            return rows
+
+        return {
+            'stages': entries(Metrics.STAGE, ('stage',)),
+            'files': entries(Metrics.FILE, ('filename', 'stage')),
+            'node_types': entries(Metrics.NODE, ('node_type',)),
+            'algorithms': entries(Metrics.ALGORITHM, ('algorithm',))
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self):
+        lines = []
+        label_names = {
+            Metrics.STAGE: ('stage',),
+            Metrics.FILE: ('filename', 'stage'),
+            Metrics.NODE: ('node_type',),
+            Metrics.ALGORITHM: ('algorithm',)
+        }
+
+        for kind, names in label_names.items():
+            entries = sorted(self.get(kind).items(), key=lambda item: str(item[0]))
+            if not entries:
+                continue
+
+            for suffix, field in (('count_total', 0), ('seconds_total', 1)):
+                metric = f'{Metrics.PREFIX}_{kind}_{suffix}'
+                lines.append(f'# TYPE {metric} counter')
+
+                for key, entry in entries:
+                    keys = key if isinstance(key, tuple) else (key,)
+                    labels = ','.join(f'{name}="{self._escape(value)}"' for name, value in zip(names, keys))
+                    lines.append(f'{metric}{{{labels}}} {entry[field]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # .prom files use the Prometheus text format, anything else is JSON
+        text = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        with open(path, 'w') as file:
+            file.write(text)
+
+    def _escape(self, value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,97 @@
+import os
+import re
+import json
+
+
+class NameIndex:
+    FORMAT_VERSION = 1
+
+    # Comments, string and char literals are blanked before the prescan
+    NOISE_PATTERN = re.compile(r'/\*.*?\*/|//[^\n]*|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.S)
+    TOKEN_PATTERN = re.compile(r'[A-Za-z_]\w*(?=\s*\()|[{}]')
+
+    def __init__(self, path):
+        self.path = path
+        self.root = None
+        self.files = {} # relative path -> {'mtime', 'size', 'names'}
+
+        self.load()
+
+    @classmethod
+    def prescan(cls, text):
+        # Every identifier followed by '(' outside of any block: a superset of
+        # the function definitions (prototypes and macro calls included), so
+        # that no defining file is ever missed
+        text = cls.NOISE_PATTERN.sub(' ', text)
+        names = set()
+        depth = 0
+
+        for match in cls.TOKEN_PATTERN.finditer(text):
+            token = match.group()
+
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth = max(depth - 1, 0)
+            elif depth == 0:
+                names.add(token)
+
+        return sorted(names)
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+
+        if data.get('version') == NameIndex.FORMAT_VERSION:
+            self.root = data['root']
+            self.files = data['files']
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        data = {'version': NameIndex.FORMAT_VERSION, 'root': self.root, 'files': self.files}
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+
+        with open(tmp_path, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self.path)
+
+    def refresh(self, file_manager, path=None):
+        root = os.path.abspath(path or file_manager.PATH)
+
+        if root != self.root:
+            self.root = root
+            self.files = {}
+
+        files = {}
+        changed = False
+
+        # Only files whose size or modification time moved are read again
+        for filename in file_manager.list_files(root):
+            stat = os.stat(os.path.join(root, filename))
+            entry = self.files.get(filename)
+
+            if entry is None or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+                text = file_manager.read_file(os.path.join(root, filename))
+                entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'names': self.prescan(text)}
+                changed = True
+
+            files[filename] = entry
+
+        changed = changed or files.keys() != self.files.keys()
+        self.files = files
+
+        if changed:
+            self.save()
+
+        return changed
+
+    def get_files(self, names):
+        names = set(names)
+        return [filename for filename, entry in self.files.items()
+            if names.intersection(entry['names'])]
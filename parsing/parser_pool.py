@@ -0,0 +1,54 @@
+import os
+import sys
+import threading
+
+from pycparser.c_parser import CParser
+
+
+class ParserPool:
+    LEXTAB = 'cscv_lextab'
+    YACCTAB = 'cscv_yacctab'
+
+    _pools = {}
+
+    def __init__(self, tables_dir=None):
+        self.tables_dir = tables_dir
+        self._local = threading.local()
+
+    @classmethod
+    def get_pool(cls, tables_dir=None):
+        # A single pool per tables directory and per process, each thread of
+        # the process then owns its own parser
+        pool = cls._pools.get(tables_dir)
+
+        if pool is None:
+            pool = ParserPool(tables_dir)
+            cls._pools[tables_dir] = pool
+
+        return pool
+
+    def get_parser(self):
+        parser = getattr(self._local, 'parser', None)
+
+        if parser is None:
+            parser = self._create_parser()
+            self._local.parser = parser
+
+        return parser
+
+    def _create_parser(self):
+        if self.tables_dir is None:
+            return CParser()
+
+        # The lexer and LALR tables are written once in tables_dir then
+        # imported from there by the next parsers (pycparser < 3 only, later
+        # versions have no tables and ignore these arguments)
+        os.makedirs(self.tables_dir, exist_ok=True)
+        if self.tables_dir not in sys.path:
+            sys.path.insert(0, self.tables_dir)
+
+        return CParser(
+            lextab=ParserPool.LEXTAB,
+            yacctab=ParserPool.YACCTAB,
+            taboutputdir=self.tables_dir
+        )
@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+
+from parsing.corpus import Corpus, NameColumn
+from parsing.file_manager import FileManager
+from parsing.vector import SyntaxToken
+
+
+class OverlappingShards(Exception):
+    pass
+
+
+class Shard:
+    """A subset of the files of a source tree, processed as an independent job.
+
+    Files are selected either by a range of a stable hash of their relative
+    path (from_index splits the hash space in count equal ranges, so the
+    shards of a split cover every file exactly once) or by an explicit list.
+    A processed shard is a Corpus directory with a shard.json listing the
+    files it covers, merge combines such directories into one Corpus.
+    """
+
+    HASH_SPACE = 2 ** 32
+    FILENAME = 'shard.json'
+
+    def __init__(self, start=0, end=None, filenames=None):
+        self.start = start
+        self.end = Shard.HASH_SPACE if end is None else end
+        self.filenames = set(filenames) if filenames is not None else None
+
+    @classmethod
+    def from_index(cls, index, count):
+        if not 0 <= index < count:
+            raise ValueError(f'shard index {index} out of range for {count} shards')
+
+        return Shard(index * Shard.HASH_SPACE // count, (index + 1) * Shard.HASH_SPACE // count)
+
+    @classmethod
+    def get_hash(cls, filename):
+        # Same value on every machine and run, unlike hash()
+        normalized = filename.replace(os.sep, '/')
+        return int.from_bytes(hashlib.sha1(normalized.encode('utf-8')).digest()[:4], 'big')
+
+    def contains(self, filename):
+        if self.filenames is not None:
+            return filename in self.filenames
+
+        return self.start <= Shard.get_hash(filename) < self.end
+
+    def select(self, filenames):
+        return [filename for filename in filenames if self.contains(filename)]
+
+    def to_dict(self):
+        return {
+            'start': self.start,
+            'end': self.end,
+            'filenames': sorted(self.filenames) if self.filenames is not None else None
+        }
+
+    def save(self, path, files):
+        # files: every file the shard parsed, with or without functions
+        with open(os.path.join(path, Shard.FILENAME), 'w') as file:
+            json.dump({**self.to_dict(), 'files': files}, file)
+
+    @classmethod
+    def load_files(cls, path):
+        with open(os.path.join(path, Shard.FILENAME), 'r') as file:
+            return json.load(file)['files']
+
+    @classmethod
+    def merge(cls, paths, output_path=None):
+        import numpy as np
+
+        owners = {}
+        blocks = []
+
+        for path in paths:
+            for filename in Shard.load_files(path):
+                if filename in owners:
+                    raise OverlappingShards(f'{filename} is in both {owners[filename]} and {path}')
+                owners[filename] = path
+
+            corpus = Corpus.load(path)
+            for file_idx, filename in enumerate(corpus.filenames):
+                blocks.append((filename, corpus, corpus.offsets[file_idx], corpus.offsets[file_idx + 1]))
+
+        # Whatever the order of the shards, files end up in the order of a
+        # single run over the whole tree
+        blocks.sort(key=lambda block: FileManager.get_walk_key(block[0]))
+
+        filenames, offsets = [], [0]
+        for filename, _, start, end in blocks:
+            filenames.append(filename)
+            offsets.append(offsets[-1] + end - start)
+
+        vectors = np.concatenate([corpus.vectors[start:end] for _, corpus, start, end in blocks]) \
+            if blocks else np.empty((0, len(SyntaxToken)), dtype=Corpus.DTYPE)
+        names = NameColumn.encode(
+            name for _, corpus, start, end in blocks for name in corpus.names[start:end])
+
+        merged = Corpus(vectors, names, filenames, offsets)
+
+        if output_path is not None:
+            merged.save(output_path)
+
+        return merged
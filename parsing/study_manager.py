@@ -1,7 +1,80 @@
-from pycparser.c_parser import CParser
+import os
+import queue
+import threading
+import time
 
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from parsing.corpus import Corpus
+from parsing.parser_pool import ParserPool
 from parsing.file_manager import FileManager
+from parsing.isolated_executor import IsolatedExecutor
 from parsing.ast_visitor import ASTVisitor as Visitor
+from parsing.logger import get_logger
+from parsing.metrics import Metrics
+from parsing.vector import Vector
+
+
+_worker_study_managers = {}
+
+
+def _get_worker_study_manager(visitor_class=Visitor, tables_dir=None):
+    # Each worker process keeps its own StudyManager (visitor and parser)
+    # alive between tasks instead of receiving one from the parent process
+    key = (visitor_class, tables_dir)
+    study_manager = _worker_study_managers.get(key)
+
+    if study_manager is None:
+        study_manager = StudyManager(visitor_class=visitor_class, tables_dir=tables_dir)
+        _worker_study_managers[key] = study_manager
+
+    return study_manager
+
+
+def _init_worker(visitor_class=Visitor, tables_dir=None):
+    # Builds the parser up front, so that the first file of an isolated
+    # worker is not charged for it in its timeout
+    _get_worker_study_manager(visitor_class, tables_dir).parser_pool.get_parser()
+
+
+def _parse_and_visit_worker(text, visitor_class=Visitor, tables_dir=None, filename=None,
+        collect_metrics=False):
+    study_manager = _get_worker_study_manager(visitor_class, tables_dir)
+
+    # Metrics of a task are sent back with its result and merged by the parent
+    metrics = Metrics() if collect_metrics else None
+    study_manager.set_metrics(metrics)
+
+    start = time.perf_counter()
+    result = study_manager.parse_and_visit(text, filename=filename)
+
+    return os.getpid(), result, metrics, time.perf_counter() - start
+
+
+def _read_files(files, files_queue, stopped):
+    # Runs on the reader thread, None marks the end of the files and an
+    # exception is handed to the consumer to be raised there
+    try:
+        for item in files:
+            if not _put_file(files_queue, item, stopped):
+                return
+        item = None
+    except Exception as error:
+        item = error
+
+    _put_file(files_queue, item, stopped)
+
+
+def _put_file(files_queue, item, stopped):
+    # Blocks while the queue is full, unless the consumer went away
+    while not stopped.is_set():
+        try:
+            files_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+
+    return False
 
 
 class FileOutput:
@@ -28,46 +101,320 @@ class FileOutput:
 
 
 class StudyManager:
-    def __init__(self):
-        self.visitor = Visitor()
+    VECTOR_CHUNK_SIZE = 1024
+
+    def __init__(self, cache=None, visitor_class=Visitor, tables_dir=None, name_index=None,
+            metrics=None, error_report=None, timeout=None, memory_limit=None):
+        self.visitor_class = visitor_class
+        self.visitor = visitor_class(metrics=metrics)
+        self.metrics = metrics
+        self.tables_dir = tables_dir
+        self.parser_pool = ParserPool.get_pool(tables_dir)
         self.file_manager = FileManager()
+        self.cache = cache
+        self.feature_space = getattr(visitor_class, 'FEATURE_SPACE', None)
+        self.name_index = name_index
+        # With an error report, a file that fails is recorded and skipped
+        # instead of ending the run. A timeout (seconds) or a memory limit
+        # (bytes) runs every file in an IsolatedExecutor worker
+        self.error_report = error_report
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.logger = get_logger(__name__)
 
     def _parse(self, text):
-        parser = CParser()
+        parser = self.parser_pool.get_parser()
         ast = parser.parse(text) 
 
         return ast
 
-    def parse_and_visit(self, text,  visitor=None):
+    def set_metrics(self, metrics):
+        self.metrics = metrics
+        self.visitor.metrics = metrics
+
+    def parse_and_visit(self, text,  visitor=None, filename=None):
         if visitor is None:
             visitor = self.visitor
 
-        ast = self._parse(text)
-        return visitor.visit(ast)
+        if self.metrics is None:
+            ast = self._parse(text)
+            return visitor.visit(ast)
+
+        with self.metrics.measure('parse', filename):
+            ast = self._parse(text)
+
+        with self.metrics.measure('visit', filename):
+            return visitor.visit(ast)
     
-    def get_files_output(self):
-        content, names = self.file_manager.load_directory()
-        results = [self.parse_and_visit(file) for file in content]
-        zipped_list = self._zip_results_names(results, names)
-
-        result = []
-        for tuple_ in zipped_list:
-            file_output = FileOutput(*tuple_)
+    def get_files_output(self, jobs=None, executor=None, progress=False, filenames=None,
+            read_ahead=None):
+        return list(self.iter_files_output(jobs, executor, progress, filenames, read_ahead))
+
+    def iter_files_output(self, jobs=None, executor=None, progress=False, filenames=None,
+            read_ahead=None):
+        # FileOutputs are yielded in reading order as soon as they are ready,
+        # the next files are only read and parsed while the consumer keeps up
+        on_error = self._record_read_error if self.error_report is not None else None
+        files = self.file_manager.iter_directory(filenames=filenames, on_error=on_error)
+
+        if self.metrics is not None:
+            files = self._measure_reads(files)
+
+        if read_ahead:
+            files = self._read_ahead(files, read_ahead)
+
+        if executor is not None:
+            results = self._parse_and_visit_with(executor, files, progress)
+        elif (jobs is not None and jobs > 1) or self._isolates_files():
+            results = self._parse_and_visit_in_pool(jobs or 1, files, progress)
+        else:
+            results = self._parse_serially(files)
+
+        for name, result in results:
+            file_output = FileOutput(name, result)
             file_output.set_filename()
-            result.append(file_output)
+            yield file_output
+
+        if self.cache is not None:
+            self.cache.evict()
+
+    def process_shard(self, shard, output_path, jobs=None, executor=None):
+        # Parses the files of the shard only, into a self-contained Corpus
+        # directory that Shard.merge can combine with the others
+        filenames = shard.select(self.file_manager.list_files())
+        corpus = Corpus.from_files_output(self.iter_files_output(jobs, executor, filenames=filenames))
+
+        corpus.save(output_path)
+        shard.save(output_path, filenames)
+
+        return corpus
+
+    def iter_vector_chunks(self, names=None, chunk_size=None, jobs=None, executor=None,
+            read_ahead=None):
+        chunk_size = chunk_size or StudyManager.VECTOR_CHUNK_SIZE
+        filenames = self.get_files_from_names(names)
+        contexts, vectors = [], []
+
+        for file_output in self.iter_files_output(jobs, executor, filenames=filenames,
+                read_ahead=read_ahead):
+            funcs_outputs = file_output.funcs_outputs
+            if names is not None:
+                funcs_outputs = file_output.get_result_from_names(names)
+
+            for func_output in funcs_outputs:
+                contexts.append(func_output.extract_name_and_filename())
+                vectors.append(func_output.vector)
+
+            if len(vectors) >= chunk_size:
+                yield contexts, Vector.vector_list_to_matrix(vectors)
+                contexts, vectors = [], []
+
+        if vectors:
+            yield contexts, Vector.vector_list_to_matrix(vectors)
+
+    def _read_ahead(self, files, size):
+        # Files are read on a separate thread while the previous ones are
+        # parsed, at most size texts wait in the queue
+        files_queue = queue.Queue(maxsize=size)
+        stopped = threading.Event()
+        reader = threading.Thread(target=_read_files, args=(files, files_queue, stopped),
+            daemon=True)
+        reader.start()
+
+        try:
+            while True:
+                item = files_queue.get()
+
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+
+                yield item
+        finally:
+            stopped.set()
+            reader.join()
+
+    def _measure_reads(self, files):
+        # The file is read by the generator while next() runs
+        files = iter(files)
+
+        while True:
+            start = time.perf_counter()
+            try:
+                name, text = next(files)
+            except StopIteration:
+                return
+
+            self.metrics.add_stage('read', time.perf_counter() - start, name)
+            yield name, text
+
+    def _record_read_error(self, filename, error):
+        # May run on the read-ahead thread
+        self.error_report.add_failure(filename, error, 'read')
+
+    def _uses_cache(self):
+        # The cache holds Vectors only, visitors with another output (such as
+        # HashedFeatureExtractor) declare no feature space and are not cached
+        return self.cache is not None and self.feature_space is not None
+
+    def _get_cached(self, text, filename=None):
+        if not self._uses_cache():
+            return None
+
+        if self.metrics is None:
+            return self.cache.get(text, self.feature_space)
+
+        with self.metrics.measure('cache', filename):
+            return self.cache.get(text, self.feature_space)
+
+    def _set_cached(self, text, result):
+        if self._uses_cache():
+            self.cache.set(text, result, self.feature_space)
+
+    def _get_cached_or_parse(self, text, filename=None):
+        result = self._get_cached(text, filename)
+
+        if result is None:
+            result = self.parse_and_visit(text, filename=filename)
+            self._set_cached(text, result)
 
         return result
-    
-    def select_from_names(self, names):
-        files_output = self.get_files_output()
+
+    def _parse_serially(self, files):
+        for name, text in files:
+            start = time.perf_counter()
+            try:
+                result = self._get_cached_or_parse(text, name)
+            except Exception as error:
+                if self.error_report is None:
+                    raise
+                self.error_report.add_failure(name, error)
+                continue
+
+            if self.error_report is not None:
+                self.error_report.add_success(name, time.perf_counter() - start)
+
+            yield name, result
+
+    def _isolates_files(self):
+        return self.timeout is not None or self.memory_limit is not None
+
+    def _parse_and_visit_in_pool(self, jobs, files, progress=False):
+        # With an error report, a crashed worker must not break the pool
+        # (BrokenProcessPool) and with it every file still to come
+        if self._isolates_files() or self.error_report is not None:
+            pool = IsolatedExecutor(max_workers=jobs, timeout=self.timeout,
+                memory_limit=self.memory_limit, initializer=_init_worker,
+                initargs=(self.visitor_class, self.tables_dir))
+        else:
+            pool = ProcessPoolExecutor(max_workers=jobs)
+
+        with pool:
+            yield from self._parse_and_visit_with(pool, files, progress, 2 * jobs)
+
+    def _parse_and_visit_with(self, executor, files, progress=False, max_in_flight=None):
+        if max_in_flight is None:
+            max_in_flight = 2 * (os.cpu_count() or 1)
+
+        # Names and results are kept by reading index until every earlier file
+        # is handed out. Results waiting for a slower file count in
+        # max_in_flight too, so at most max_in_flight files are held at once
+        names, results = {}, {}
+        in_flight = {}
+        workers_count = {}
+        next_idx = 0
+
+        for idx, (name, text) in enumerate(files):
+            names[idx] = name
+            result = self._get_cached(text, name)
+
+            if result is not None:
+                results[idx] = result
+                if self.error_report is not None:
+                    self.error_report.add_success(name, 0.0)
+            else:
+                future = executor.submit(_parse_and_visit_worker, text, self.visitor_class,
+                    self.tables_dir, name, self.metrics is not None)
+                in_flight[future] = (idx, name, text)
+
+            finished = [future for future in in_flight if future.done()]
+            self._collect_results(finished, in_flight, results, workers_count, progress)
+            next_idx = yield from self._iter_ready(names, results, next_idx)
+
+            while len(in_flight) + len(results) >= max_in_flight:
+                next_idx = yield from self._wait_next(names, results, in_flight, workers_count,
+                    next_idx, progress)
+
+        while in_flight:
+            next_idx = yield from self._wait_next(names, results, in_flight, workers_count,
+                next_idx, progress)
+
+    def _wait_next(self, names, results, in_flight, workers_count, next_idx, progress=False):
+        if next_idx not in results:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            self._collect_results(finished, in_flight, results, workers_count, progress)
+
+        return (yield from self._iter_ready(names, results, next_idx))
+
+    def _iter_ready(self, names, results, next_idx):
+        # A failed file holds its place in results as None and is skipped
+        while next_idx in results:
+            name, result = names.pop(next_idx), results.pop(next_idx)
+            next_idx += 1
+
+            if result is not None:
+                yield name, result
+
+        return next_idx
+
+    def _collect_results(self, futures, in_flight, results, workers_count, progress=False):
+        # Results are stored by reading index so the output order does not
+        # depend on which worker finishes first
+        for future in futures:
+            idx, name, text = in_flight.pop(future)
+            try:
+                pid, result, metrics, seconds = future.result()
+            except Exception as error:
+                if self.error_report is None:
+                    raise
+                self.error_report.add_failure(name, error)
+                results[idx] = None
+                continue
+
+            results[idx] = result
+
+            if self.error_report is not None:
+                self.error_report.add_success(name, seconds)
+
+            if metrics is not None:
+                self.metrics.merge(metrics)
+
+            self._set_cached(text, result)
+
+            workers_count[pid] = workers_count.get(pid, 0) + 1
+
+            if progress:
+                self.logger.info(f'Worker {pid}: {workers_count[pid]} file(s) done '
+                    f'({sum(workers_count.values())} in total)')
+
+    def select_from_names(self, names, jobs=None, executor=None):
+        filenames = self.get_files_from_names(names)
+        files_output = self.get_files_output(jobs, executor, filenames=filenames)
         filtered_outputs = [output.get_result_from_names(
             names) for output in files_output]
 
-        print(filtered_outputs[0])
+        if filtered_outputs:
+            print(filtered_outputs[0])
         return filtered_outputs 
     
-    def _zip_results_names(self, results, names):
-        return list(zip(names, results))
+    def get_files_from_names(self, names):
+        # With an index, only the files that may define one of the names are parsed
+        if self.name_index is None or names is None:
+            return None
+
+        self.name_index.refresh(self.file_manager)
+        return self.name_index.get_files(names)
     
     @classmethod
     def filter_non_empty_list(cls, lists):
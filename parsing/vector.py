@@ -1,5 +1,7 @@
 import enum
 
+from array import array
+
 
 class SyntaxToken(enum.Enum):
     OP_PLS, \
@@ -36,6 +38,11 @@ class SyntaxToken(enum.Enum):
     CAST = range(32)
 
 class Vector:
+    __slots__ = ('values',)
+
+    TYPECODE = 'q'
+    EMPTY_VALUES = array(TYPECODE, bytes(array(TYPECODE).itemsize * len(SyntaxToken)))
+
     syntax_map = {
         '+': SyntaxToken.OP_PLS,
         '-': SyntaxToken.OP_MIN,
@@ -64,9 +71,11 @@ class Vector:
 
     def __init__(self, values=None):
         if values is None:
-            self.values = [0 for _ in range(len(SyntaxToken))]
+            self.values = Vector.EMPTY_VALUES[:]
+        elif isinstance(values, array):
+            self.values = values
         else:
-            self.values = values 
+            self.values = array(Vector.TYPECODE, values)
     
     def incremente_token(self, token, value=1):
         self.values[token.value] += value
@@ -82,7 +91,20 @@ class Vector:
         self.incremente_token(op_token)
     
     def to_list(self):
-        return self.values
+        return self.values.tolist()
+
+    def copy(self):
+        return Vector(self.values[:])
+
+    def __iadd__(self, other):
+        values = self.values
+
+        # Most vectors only hold a handful of non-zero tokens
+        for idx, value in enumerate(other.values):
+            if value:
+                values[idx] += value
+
+        return self
     
     def summary(self):
         string = []
@@ -102,20 +124,36 @@ class Vector:
 
     @classmethod
     def merge(cls, *vectors):
-        if len(vectors) < 3 :
-            vectors = [*vectors, Vector()]
-        
-        vectors = Vector.filter_vectors(*vectors)
-        lists = (vector.values for vector in vectors)
+        result = None
+
+        # The first vector is copied once, the others are accumulated into it
+        for vector in vectors:
+            if not isinstance(vector, Vector):
+                continue
 
-        return Vector([sum(values) for values in zip(*lists)])
+            if result is None:
+                result = vector.copy()
+            else:
+                result += vector
+
+        return result if result is not None else Vector()
     
     @classmethod
     def vector_list_to_list_of_list(cls, vector_list):
         return [vector.to_list() for vector in vector_list]
+
+    @classmethod
+    def vector_list_to_matrix(cls, vector_list):
+        import numpy as np
+
+        # The buffers are concatenated once and viewed as a (n, 32) matrix
+        buffer = bytearray().join(vector.values for vector in vector_list)
+        matrix = np.frombuffer(buffer, dtype=np.int64)
+
+        return matrix.reshape(-1, len(SyntaxToken))
     
     def __str__(self):
-        return str(self.values)
+        return str(self.values.tolist())
     
     def __repr__(self):
-        return str(self.values)     
\ No newline at end of file
+        return str(self.values.tolist())     
\ No newline at end of file
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import hashlib
+
+from parsing.ast_visitor import FunctionOutput
+from parsing.vector import Vector, SyntaxToken
+
+
+class VectorCache:
+    # 2: merge no longer empties vectors with calls of three or more arguments
+    FORMAT_VERSION = 2
+    EXTENSION = '.json'
+    FEATURE_SPACE = 'syntax_tokens'
+
+    def __init__(self, path, max_size=None, max_age=None):
+        self.path = path
+        self.max_size = max_size # bytes
+        self.max_age = max_age # seconds since the last access
+
+        self.layout_version = VectorCache.get_layout_version()
+
+    @classmethod
+    def get_layout_version(cls):
+        # Any change to the SyntaxToken layout invalidates every stored vector
+        tokens = ','.join(f'{token.name}={token.value}' for token in SyntaxToken)
+        layout = f'{cls.FORMAT_VERSION}:{tokens}'
+
+        return hashlib.sha256(layout.encode('utf-8')).hexdigest()[:16]
+
+    def get_key(self, text, feature_space=None):
+        # Visitors computing different vectors from the same text never share
+        # an entry
+        feature_space = feature_space or VectorCache.FEATURE_SPACE
+        hasher = hashlib.sha256(f'{self.layout_version}:{feature_space}'.encode('utf-8'))
+        hasher.update(text.encode('utf-8'))
+
+        return hasher.hexdigest()
+
+    def get(self, text, feature_space=None):
+        entry_path = self._get_entry_path(self.get_key(text, feature_space))
+
+        try:
+            with open(entry_path, 'r') as file:
+                entries = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # Refresh the access time used by the age and size eviction
+        self._touch(entry_path)
+
+        return [FunctionOutput(name, Vector(values)) for name, values in entries]
+
+    def set(self, text, funcs_outputs, feature_space=None):
+        entry_path = self._get_entry_path(self.get_key(text, feature_space))
+        entries = [[func.name, func.vector.to_list()] for func in funcs_outputs]
+
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        # Written next to the entry then renamed so that concurrent runs never
+        # read a partially written file
+        tmp_path = f'{entry_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(entries, file)
+        os.replace(tmp_path, entry_path)
+
+    def evict(self):
+        if self.max_size is None and self.max_age is None:
+            return
+
+        entries = sorted(self._list_entries(), key=lambda entry: entry[1])
+        now = time.time()
+
+        if self.max_age is not None:
+            expired = [entry for entry in entries if now - entry[1] > self.max_age]
+            entries = [entry for entry in entries if now - entry[1] <= self.max_age]
+            self._remove_entries(expired)
+
+        if self.max_size is not None:
+            total_size = sum(size for _, _, size in entries)
+            oldest = []
+
+            while entries and total_size > self.max_size:
+                entry = entries.pop(0)
+                total_size -= entry[2]
+                oldest.append(entry)
+
+            self._remove_entries(oldest)
+
+    def clear(self):
+        self._remove_entries(self._list_entries())
+
+    def _get_entry_path(self, key):
+        return os.path.join(self.path, key[:2], f'{key}{VectorCache.EXTENSION}')
+
+    def _touch(self, entry_path):
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+    def _list_entries(self):
+        if not os.path.exists(self.path):
+            return []
+
+        entries = []
+        for directory, _, files in os.walk(self.path):
+            for filename in files:
+                if not filename.endswith(VectorCache.EXTENSION):
+                    continue
+
+                entry_path = os.path.join(directory, filename)
+                stat = os.stat(entry_path)
+                entries.append((entry_path, stat.st_mtime, stat.st_size))
+
+        return entries
+
+    def _remove_entries(self, entries):
+        for entry_path, _, _ in entries:
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,155 @@
+import os
+import json
+import bisect
+
+from parsing.ast_visitor import FunctionOutput
+from parsing.vector import Vector
+from parsing.vector_cache import VectorCache
+
+
+class IncompatibleVectorStore(Exception):
+    pass
+
+
+class VectorStore:
+    """Function vectors as one int32 matrix plus a label table.
+
+    Rows are grouped by file: the functions of filenames[i] are the rows
+    offsets[i] to offsets[i + 1]. On disk the matrix is a .npy file loaded
+    memory-mapped and the labels a JSON table next to it.
+    """
+
+    # NumPy is imported by the methods that need it, so that a parsing run
+    # that never builds a store does not load it
+    DTYPE = 'int32'
+    MATRIX_FILENAME = 'vectors.npy'
+    LABELS_FILENAME = 'labels.json'
+
+    def __init__(self, vectors, names, filenames, offsets):
+        self.vectors = vectors
+        self.names = names
+        self.filenames = filenames
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_function_outputs(cls, outputs):
+        names, filenames, offsets = [], [], []
+
+        for idx, output in enumerate(outputs):
+            names.append(output.name)
+
+            # Consecutive functions of the same file share one filename entry
+            if not filenames or filenames[-1] != output.filename:
+                filenames.append(output.filename)
+                offsets.append(idx)
+
+        offsets.append(len(names))
+        vectors = Vector.vector_list_to_matrix(output.vector for output in outputs)
+
+        return cls(vectors.astype(VectorStore.DTYPE), names, filenames, offsets)
+
+    @classmethod
+    def from_files_output(cls, files_output):
+        return cls.from_function_outputs(
+            [output for file_output in files_output for output in file_output.funcs_outputs])
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        import numpy as np
+
+        with open(os.path.join(path, VectorStore.LABELS_FILENAME), 'r') as file:
+            labels = json.load(file)
+
+        if labels['layout_version'] != VectorCache.get_layout_version():
+            raise IncompatibleVectorStore(path)
+
+        vectors = np.load(os.path.join(path, VectorStore.MATRIX_FILENAME), mmap_mode='r' if mmap else None)
+
+        return cls(vectors, cls._load_names(path, labels, mmap), labels['filenames'], labels['offsets'])
+
+    @classmethod
+    def _load_names(cls, path, labels, mmap=True):
+        if 'names' in labels:
+            return labels['names']
+
+        # Saved by a Corpus: a table of unique names and one code per row
+        import numpy as np
+
+        codes = np.load(os.path.join(path, labels['names_filename']), mmap_mode='r' if mmap else None)
+        return [labels['name_table'][code] for code in codes]
+
+    def save(self, path):
+        import numpy as np
+
+        os.makedirs(path, exist_ok=True)
+
+        labels = {
+            'layout_version': VectorCache.get_layout_version(),
+            **self._save_names(path),
+            'filenames': self.filenames,
+            'offsets': self.offsets
+        }
+
+        np.save(os.path.join(path, VectorStore.MATRIX_FILENAME), np.asarray(self.vectors, dtype=VectorStore.DTYPE))
+        with open(os.path.join(path, VectorStore.LABELS_FILENAME), 'w') as file:
+            json.dump(labels, file)
+
+    def _save_names(self, path):
+        # Labels entries of the names, a subclass may store them in a file of its own
+        return {'names': self.names}
+
+    def get_filename(self, idx):
+        return self.filenames[bisect.bisect_right(self.offsets, idx) - 1]
+
+    def get_contexts(self):
+        contexts = []
+
+        for file_idx, filename in enumerate(self.filenames):
+            start, end = self.offsets[file_idx], self.offsets[file_idx + 1]
+            contexts.extend((name, filename) for name in self.names[start:end])
+
+        return contexts
+
+    def get_function_output(self, idx):
+        output = FunctionOutput(self.names[idx], Vector(self.vectors[idx].tolist()))
+        output.filename = self.get_filename(idx)
+
+        return output
+
+    def select(self, names):
+        # Rows of the given function names, in the same order as a
+        # StudyManager.select_from_names run over the same files
+        import numpy as np
+
+        names = set(names)
+        indexes, filenames, offsets = [], [], []
+
+        for file_idx, filename in enumerate(self.filenames):
+            start, end = self.offsets[file_idx], self.offsets[file_idx + 1]
+            selected = [idx for idx in range(start, end) if self.names[idx] in names]
+
+            if selected:
+                filenames.append(filename)
+                offsets.append(len(indexes))
+                indexes.extend(selected)
+
+        offsets.append(len(indexes))
+        vectors = np.asarray(self.vectors[indexes], dtype=VectorStore.DTYPE).reshape(-1, self.vectors.shape[1])
+
+        return self.__class__(vectors, [self.names[idx] for idx in indexes], filenames, offsets)
+
+    def iter_function_outputs(self):
+        return (self.get_function_output(idx) for idx in range(len(self)))
+
+    def export_vectors(self):
+        # Same text as the former vectors.txt export, written row by row
+        for idx in range(len(self)):
+            yield f'D{idx}:\n {self.vectors[idx].tolist()}'
+
+    def export_summary(self):
+        # Same text as FunctionOutput.summarize_elements
+        for idx in range(len(self)):
+            yield f'D{idx}\n{Vector(self.vectors[idx].tolist()).summary()}'
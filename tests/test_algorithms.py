@@ -0,0 +1,44 @@
+import os
+import sys
+import subprocess
+
+import numpy as np
+import pytest
+
+from clustering_.algorithms import AlgorithmManager
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_first_timed_algorithm_is_not_charged_the_sklearn_import():
+    # A fresh interpreter, so that scikit-learn is not loaded yet
+    code = '\n'.join([
+        'import sys',
+        'from clustering_.algorithms import _run_algorithm',
+        'assert "sklearn" not in sys.modules',
+        'loaded = []',
+        'def algorithm(vectors):',
+        '    loaded.append("sklearn.cluster" in sys.modules and "sklearn.metrics" in sys.modules)',
+        '    return [0] * len(vectors)',
+        '_run_algorithm(algorithm, [[0], [1]], {})',
+        'assert loaded == [True], loaded',
+    ])
+    process = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+        capture_output=True, text=True)
+
+    assert process.returncode == 0, process.stderr
+
+
+def test_monitor_warns_only_when_refitting(recwarn):
+    vectors = np.array([[0, 0], [1, 1], [9, 9], [10, 10]])
+    kwargs = {'n_clusters': None, 'distance_threshold': 5}
+    algorithm_manager = AlgorithmManager()
+
+    _, clusters = algorithm_manager.monitor_cluster_evolution(None, vectors, {**kwargs, 'linkage': 'single'})
+    assert clusters == [1, 2, 2]
+    assert not [warning for warning in recwarn if warning.category is RuntimeWarning]
+
+    with pytest.warns(RuntimeWarning, match='refits'):
+        _, clusters = algorithm_manager.monitor_cluster_evolution(None, vectors, {**kwargs, 'linkage': 'ward'})
+    assert clusters == [1, 2, 2]
@@ -0,0 +1,46 @@
+from parsing.ast_visitor import FunctionOutput
+from parsing.corpus import Corpus
+from parsing.study_manager import FileOutput
+from parsing.vector import Vector, SyntaxToken
+
+
+def _get_corpus():
+    first, second = [0] * len(SyntaxToken), [0] * len(SyntaxToken)
+    first[0], second[1] = 1, 2
+
+    outputs = [FunctionOutput('f', Vector(first)), FunctionOutput('g', Vector(second))]
+    return Corpus.from_files_output([FileOutput('a.c', outputs)])
+
+
+def test_set_filename_on_views():
+    corpus = _get_corpus()
+    views = [corpus.get_function_output(idx) for idx in range(len(corpus))]
+
+    FileOutput('b.c', views).set_filename()
+
+    assert [view.filename for view in views] == ['b.c', 'b.c']
+    # Overrides belong to the views, the corpus keeps its own filenames
+    assert corpus.get_function_output(0).filename == 'a.c'
+
+
+def test_vector_updates_are_kept_by_the_view():
+    corpus = _get_corpus()
+    view = corpus.get_function_output(0)
+
+    view.vector += corpus.get_function_output(1).vector
+    assert view.vector.to_list()[:2] == [1, 2]
+
+    view.vector.values[2] = 5
+    assert view.vector.to_list()[:3] == [1, 2, 5]
+    assert corpus.get_function_output(0).vector.to_list()[:3] == [1, 0, 0]
+
+
+def test_name_and_label_assignment():
+    corpus = _get_corpus()
+    views = [corpus.get_function_output(idx) for idx in range(len(corpus))]
+
+    views[1].name = 'h'
+    FunctionOutput.label_elements(views)
+
+    assert [view.extract_name_and_filename() for view in views] == [('f', 'a.c'), ('h', 'a.c')]
+    assert [view.label for view in views] == ['D0', 'D1']
@@ -0,0 +1,44 @@
+import locale
+
+import pytest
+
+from parsing.error_report import ErrorReport
+from parsing.file_manager import FileManager
+from parsing.study_manager import StudyManager
+
+
+GOOD_SOURCE = 'int add(int a, int b) { return a + b; }\n'
+# Latin-1 'é' in a comment, not valid UTF-8
+LATIN_1_SOURCE = b'/* r\xe9sum\xe9 */\nint sub(int a, int b) { return a - b; }\n'
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    (tmp_path / 'a_good.c').write_text(GOOD_SOURCE)
+    (tmp_path / 'b_latin1.c').write_bytes(LATIN_1_SOURCE)
+    monkeypatch.setattr(FileManager, 'PATH', str(tmp_path))
+
+    return tmp_path
+
+
+@pytest.mark.skipif(locale.getpreferredencoding(False).lower().replace('-', '') != 'utf8',
+    reason='files are decoded with the locale encoding')
+@pytest.mark.parametrize('options', [{}, {'jobs': 2}, {'timeout': 30}])
+def test_undecodable_file_is_reported_and_skipped(sources, options):
+    error_report = ErrorReport()
+    study_manager = StudyManager(error_report=error_report, timeout=options.get('timeout'))
+
+    files_output = study_manager.get_files_output(jobs=options.get('jobs'))
+
+    assert [file_output.filename for file_output in files_output] == ['a_good.c']
+    assert [func.name for func in files_output[0].funcs_outputs] == ['add']
+    assert [(failure['filename'], failure['kind']) for failure in error_report.failures] \
+        == [('b_latin1.c', 'read')]
+    assert error_report.files_count == 2
+
+
+@pytest.mark.skipif(locale.getpreferredencoding(False).lower().replace('-', '') != 'utf8',
+    reason='files are decoded with the locale encoding')
+def test_undecodable_file_raises_without_report(sources):
+    with pytest.raises(UnicodeDecodeError):
+        StudyManager().get_files_output()